@@ -0,0 +1,93 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+similarity_threshold = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+ttl_seconds = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+max_entries = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))
+
+
+def document_ids(docs):
+    """Stable identifiers of retrieved chunks: their vector ID, or a hash of their text."""
+    ids = []
+    for doc in docs:
+        doc_id = doc.metadata.get('chunk_id') or doc.metadata.get('id')
+        if not doc_id:
+            doc_id = hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()[:32]
+        ids.append(doc_id)
+    return tuple(ids)
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norms = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norms if norms else 0.0
+
+
+class AnswerCache:
+    """Semantic cache of QA answers.
+
+    An answer is reused when a new question's embedding is within the
+    similarity threshold of a previously answered one *and* retrieval returned
+    the same documents, so answers never outlive the context they were built
+    from. Entries expire after ttl seconds and the least recently used are
+    evicted beyond max_size.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_size=None):
+        self.threshold = similarity_threshold if threshold is None else threshold
+        self.ttl = ttl_seconds if ttl is None else ttl
+        self.max_size = max_size or max_entries
+        self.entries = OrderedDict()  # entry id -> (doc_ids, vector, answer, created)
+        self.by_documents = {}         # doc_ids -> set of entry ids
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def remove(self, entry_id):
+        doc_ids = self.entries.pop(entry_id)[0]
+        bucket = self.by_documents[doc_ids]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self.by_documents[doc_ids]
+
+    def lookup(self, question_vector, doc_ids):
+        """Return a cached answer for a near-identical question over the same documents, or None."""
+        now = time.monotonic()
+        with self.lock:
+            best, best_score = None, self.threshold
+            for entry_id in list(self.by_documents.get(doc_ids, ())):
+                _, vector, answer, created = self.entries[entry_id]
+                if now - created > self.ttl:
+                    self.remove(entry_id)
+                    continue
+                score = cosine(question_vector, vector)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.stats['misses'] += 1
+                metrics.inc('cache_requests_total', cache='answer', result='miss')
+                return None
+            self.entries.move_to_end(best)
+            self.stats['hits'] += 1
+            metrics.inc('cache_requests_total', cache='answer', result='hit')
+            return self.entries[best][2]
+
+    def store(self, question_vector, doc_ids, answer):
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (doc_ids, list(question_vector), answer, time.monotonic())
+            self.by_documents.setdefault(doc_ids, set()).add(entry_id)
+            while len(self.entries) > self.max_size:
+                self.remove(next(iter(self.entries)))
+
+    def report(self):
+        total = self.stats['hits'] + self.stats['misses']
+        rate = self.stats['hits'] / total if total else 0.0
+        return f"Answer cache: {self.stats['hits']} hits / {total} questions ({rate:.1%}), {len(self.entries)} entries"
@@ -0,0 +1,70 @@
+"""Time-to-first-token of the chat server under N concurrent users (stub backends).
+
+    python -m benchmarks.bench_chat_server [--users 1 10 50] [--questions 5]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from chat_server import ChatServer, StubBackend
+
+
+async def ask(port, session_id, question):
+    """Send one question and return (time to first token, total time) in seconds."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({'session_id': session_id, 'question': question}).encode()
+    writer.write(b"POST /chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    first_token = None
+    while True:
+        line = await reader.readline()
+        if not line or line.startswith(b"event: done") or line.startswith(b"event: error"):
+            break
+        if first_token is None and line.startswith(b"data:"):
+            first_token = time.perf_counter() - start
+    writer.close()
+    return first_token, time.perf_counter() - start
+
+
+async def user(port, user_id, questions):
+    results = []
+    for i in range(questions):
+        results.append(await ask(port, f"user-{user_id}", f"Question {i} from user {user_id}"))
+    return results
+
+
+async def run(users, questions, backend):
+    server = await ChatServer(backend).serve('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    per_user = await asyncio.gather(*(user(port, u, questions) for u in range(users)))
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    ttft = [r[0] for results in per_user for r in results]
+    total = [r[1] for results in per_user for r in results]
+    print(f"{users:>4} users: TTFT p50 {np.percentile(ttft, 50) * 1000:7.1f} ms  "
+          f"p99 {np.percentile(ttft, 99) * 1000:7.1f} ms  | answer p50 {np.percentile(total, 50) * 1000:7.1f} ms  "
+          f"| {len(total) / elapsed:.1f} answers/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--questions', type=int, default=5, help="questions per user, asked in turn")
+    parser.add_argument('--retrieval-latency', type=float, default=0.05)
+    parser.add_argument('--first-token-latency', type=float, default=0.2)
+    parser.add_argument('--token-latency', type=float, default=0.02)
+    args = parser.parse_args()
+    backend = StubBackend(args.retrieval_latency, args.first_token_latency, args.token_latency)
+    for users in args.users:
+        asyncio.run(run(users, args.questions, backend))
+
+
+if __name__ == "__main__":
+    main()
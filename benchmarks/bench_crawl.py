@@ -0,0 +1,113 @@
+"""Crawl wall-time: sequential scraper vs the pooled concurrent crawler.
+
+Runs both against the local fixture server, so no network is needed, then
+measures an incremental re-crawl after a few new publications appear:
+    python -m benchmarks.bench_crawl [--latency 0.05] [--workers 16] [--host-limit 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import fixture_server
+
+
+def reset_links(scraper):
+    scraper.cursor.execute("DELETE FROM pdf_links")
+    scraper.cursor.execute("DELETE FROM crawl_state")
+    scraper.conn.commit()
+    scraper.store.known.clear()
+
+
+def requests_served():
+    return fixture_server.FixtureHandler.request_count
+
+
+def stored_links(scraper):
+    scraper.cursor.execute("SELECT url FROM pdf_links")
+    return {row[0] for row in scraper.cursor.fetchall()}
+
+
+def run(latency, pages, workers, host_limit, throttle_every=0):
+    """Crawl the fixture site sequentially, concurrently and incrementally; return the measurements."""
+    fixture_server.latency = latency
+    fixture_server.total_pages = pages
+    server, base = fixture_server.start_server()
+
+    # Point the scraper at a scratch database before it connects
+    os.environ['LINKS_DB'] = os.path.join(tempfile.mkdtemp(), 'links.db')
+    import scraper
+    import crawler
+
+    reset_links(scraper)
+    expected = fixture_server.expected_pdf_links(base)
+    base_url = f"{base}/publications"
+
+    before = requests_served()
+    start = time.perf_counter()
+    scraper.collect_all_pdf_links(base_url, pages)
+    sequential_time = time.perf_counter() - start
+    sequential_requests = requests_served() - before
+    sequential_links = stored_links(scraper)
+
+    reset_links(scraper)
+    fixture_server.throttle_every = throttle_every
+    start = time.perf_counter()
+    crawler.collect_all_pdf_links_concurrent(base_url, pages, workers=workers, host_limit=host_limit)
+    concurrent_time = time.perf_counter() - start
+    concurrent_links = stored_links(scraper)
+
+    # Weekly re-crawl: a couple of new publications appear on page 1
+    fixture_server.throttle_every = 0
+    fixture_server.new_publications = 2
+    known_links = stored_links(scraper)
+    before = requests_served()
+    start = time.perf_counter()
+    found_links = crawler.collect_all_pdf_links_concurrent(base_url, pages, workers=workers,
+                                                         host_limit=host_limit, incremental=True)
+    incremental_time = time.perf_counter() - start
+    incremental_requests = requests_served() - before
+    incremental_links = stored_links(scraper)
+    incremental_complete = incremental_links == fixture_server.expected_pdf_links(base)
+    fixture_server.new_publications = 0
+
+    server.shutdown()
+    return {
+        'links': len(expected),
+        'pages_fetched': sequential_requests,
+        'sequential_s': sequential_time,
+        'sequential_pages_per_sec': sequential_requests / sequential_time,
+        'concurrent_s': concurrent_time,
+        'concurrent_pages_per_sec': sequential_requests / concurrent_time,
+        'speedup': sequential_time / concurrent_time,
+        'same_links': sequential_links == concurrent_links == expected,
+        'incremental_s': incremental_time,
+        'incremental_requests': incremental_requests,
+        'incremental_found_links': len(set(found_links)),
+        'incremental_new_links': len(incremental_links - known_links),
+        'incremental_complete': incremental_complete,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=fixture_server.latency)
+    parser.add_argument('--pages', type=int, default=fixture_server.total_pages)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--host-limit', type=int, default=8)
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help="answer every Nth request with 429 to exercise Retry-After")
+    args = parser.parse_args()
+
+    result = run(args.latency, args.pages, args.workers, args.host_limit, args.throttle_every)
+    print(f"Sequential crawl: {result['sequential_s']:.2f}s, {result['links']} links")
+    print(f"Concurrent crawl: {result['concurrent_s']:.2f}s")
+    print(f"Speed-up: {result['speedup']:.1f}x")
+    print(f"Same pdf_links table: {result['same_links']}")
+    print(f"Incremental re-crawl: {result['incremental_s']:.2f}s, {result['incremental_requests']} requests, "
+          f"{result['incremental_found_links']} links found, {result['incremental_new_links']} new, "
+          f"complete: {result['incremental_complete']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Near-duplicate detection on a synthetic corpus with re-uploads and boilerplate.
+
+Every report gets the same front matter and disclaimer (with its own page
+numbers and title), and some reports are uploaded again under a new path
+with a few words changed. Reports which duplicates were caught, what was
+wrongly dropped and how many vectors were avoided:
+    python -m benchmarks.bench_dedup [--reports 200] [--reuploads 40]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from langchain.schema import Document
+
+from benchmarks.pdf_fixture import words
+from dedup import Deduplicator
+
+boilerplate = [
+    "Climate Change Committee {title}. Presented to Parliament pursuant to Section 36 of the Climate Change "
+    "Act 2008. Crown copyright. This publication is licensed under the terms of the Open Government Licence. "
+    "Any enquiries regarding this publication should be sent to us at communications page {page}.",
+    "Acknowledgements. The Committee would like to thank the team that prepared the analysis for this report "
+    "and the organisations and individuals who contributed evidence, page {page}. {title}.",
+]
+
+
+def chunk(text, doc_hash, page, offset):
+    return Document(page_content=text, metadata={'doc_hash': doc_hash, 'page': page, 'start_index': offset})
+
+
+def make_report(rng, number, chunks):
+    """(url, chunks, number of boilerplate chunks) of a report with front matter and body text."""
+    doc_hash = f"report-{number}"
+    title = f"Progress report {number}"
+    texts = [template.format(title=title, page=rng.randint(1, 9)) for template in boilerplate]
+    # Half the body words are the shared vocabulary, half are rare terms of this report
+    texts += [" ".join(rng.choice(words) if rng.random() < 0.5 else f"term{rng.randrange(10 ** 6)}"
+                       for _ in range(150)) for _ in range(chunks)]
+    return (f"https://example.org/wp-content/uploads/2023/06/report-{number}.pdf",
+            [chunk(text, doc_hash, i, 0) for i, text in enumerate(texts)], len(boilerplate))
+
+
+def reupload(rng, url, chunks, edits):
+    """The same report under a new path, with a few words changed."""
+    copy = []
+    for document in chunks:
+        tokens = document.page_content.split()
+        for _ in range(edits):
+            tokens[rng.randrange(len(tokens))] = rng.choice(words)
+        copy.append(chunk(" ".join(tokens), document.metadata['doc_hash'] + "-v2", document.metadata['page'], 0))
+    return url.replace("/2023/06/", "/2024/01/"), copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=200)
+    parser.add_argument('--reuploads', type=int, default=40)
+    parser.add_argument('--chunks', type=int, default=30, help="body chunks per report")
+    parser.add_argument('--edits', type=int, default=1, help="words changed per chunk of a re-upload")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    reports = [make_report(rng, number, args.chunks) for number in range(args.reports)]
+    corpus = [(url, chunks) for url, chunks, _ in reports]
+    copies = rng.sample(reports, args.reuploads)
+    corpus += [reupload(rng, url, chunks, args.edits) for url, chunks, _ in copies]
+    total = sum(len(chunks) for _, chunks in corpus)
+    # Everything a perfect detector would drop: whole re-uploads and all but the first copy of the boilerplate
+    expected_documents = {url.replace("/2023/06/", "/2024/01/") for url, _, _ in copies}
+    expected_chunks = (args.reports - 1) * len(boilerplate)
+
+    with tempfile.TemporaryDirectory() as directory:
+        dedup = Deduplicator(os.path.join(directory, 'links.db'))
+        start = time.perf_counter()
+        dropped_documents = {url for url, chunks in corpus if not dedup.unique(url, chunks)}
+        elapsed = time.perf_counter() - start
+        print(dedup.report())
+        dedup.close()
+
+    stats = dedup.stats
+    print(f"{len(corpus)} documents, {total} chunks in {elapsed:.2f}s ({total / elapsed:.0f} chunks/sec)")
+    print(f"Re-uploads: {len(dropped_documents & expected_documents)} of {len(expected_documents)} caught, "
+          f"{len(dropped_documents - expected_documents)} originals wrongly dropped")
+    print(f"Boilerplate chunks: {stats['duplicate_chunks']} dropped of {expected_chunks} repeated copies")
+    print(f"Index size: {total - stats['skipped_chunks']} vectors instead of {total} "
+          f"({stats['skipped_chunks'] / total:.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
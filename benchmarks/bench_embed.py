@@ -0,0 +1,54 @@
+"""Embedding throughput: one request per chunk vs the batched EmbeddingStage.
+
+Uses the deterministic FakeEmbeddings with a simulated round trip and
+periodic 429s, so it runs offline:
+    python -m benchmarks.bench_embed [--chunks 5000] [--latency 0.05] [--in-flight 4]
+"""
+import argparse
+import random
+import time
+
+import embedder
+from embedder import EmbeddingStage, FakeEmbeddings
+
+
+def synthetic_chunks(count, seed=0):
+    rng = random.Random(seed)
+    words = ("net zero emissions carbon budget CB6 ZEV mandate MtCO2e adaptation "
+             "heat pumps progress report sector pathway land use aviation").split()
+    return [" ".join(rng.choice(words) for _ in range(40)) + f" #{i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated seconds per request")
+    parser.add_argument('--rate-limit-every', type=int, default=7, help="every Nth request returns 429")
+    parser.add_argument('--in-flight', type=int, default=4)
+    parser.add_argument('--baseline-chunks', type=int, default=200,
+                        help="chunks embedded one request at a time for the baseline")
+    args = parser.parse_args()
+    texts = synthetic_chunks(args.chunks)
+
+    baseline = FakeEmbeddings(latency=args.latency)
+    start = time.perf_counter()
+    for text in texts[:args.baseline_chunks]:
+        baseline.embed_documents([text])
+    baseline_rate = args.baseline_chunks / (time.perf_counter() - start)
+
+    fake = FakeEmbeddings(latency=args.latency, rate_limit_every=args.rate_limit_every)
+    stage = EmbeddingStage(fake, in_flight=args.in_flight, retries=10)
+    embedder.backoff_factor = args.latency  # keep simulated retries short
+    start = time.perf_counter()
+    vectors = stage.embed(texts)
+    batched_rate = len(texts) / (time.perf_counter() - start)
+    stage.close()
+
+    in_order = all(vector == fake.vector(text) for text, vector in zip(texts[:100], vectors))
+    print(f"One request per chunk: {baseline_rate:.1f} chunks/sec")
+    print(f"Batched stage: {batched_rate:.1f} chunks/sec ({stage.report()})")
+    print(f"Order preserved: {in_order}")
+
+
+if __name__ == "__main__":
+    main()
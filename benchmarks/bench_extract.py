@@ -0,0 +1,90 @@
+"""Peak memory and throughput of PDF extraction: load everything vs stream pages.
+
+Writes a large synthetic report (text and an image on every page) and
+extracts and chunks it in a fresh process per path, so each peak RSS is
+measured on its own:
+    python -m benchmarks.bench_extract [--pages 400] [--image-size 512]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from benchmarks.pdf_fixture import write_pdf
+
+
+def rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_all(path, splitter):
+    """The old path: the whole file in a BytesIO, every page's text in a list, then chunking."""
+    from langchain.schema import Document
+    from pypdf import PdfReader
+
+    with open(path, 'rb') as f:
+        reader = PdfReader(BytesIO(f.read()))
+    pages = [Document(page_content=page.extract_text(), metadata={'source': path, 'page': number})
+             for number, page in enumerate(reader.pages)]
+    return len(pages), splitter.split_documents(pages)
+
+
+def stream_pages(path, splitter):
+    """The ingestion path: pages yielded one at a time from the memory map and chunked as they arrive."""
+    from pdf_cache import iter_pdf_pages
+
+    chunks, page_count = [], 0
+    for page in iter_pdf_pages(path, path):
+        chunks.extend(splitter.split_documents([page]))
+        page_count += 1
+    return page_count, chunks
+
+
+paths = {'load-all': load_all, 'streaming': stream_pages}
+
+
+def measure(name, path):
+    """Run one extraction path in this process and return its numbers."""
+    from ingest import create_text_splitter
+
+    splitter = create_text_splitter()
+    baseline = rss_mb()  # interpreter, pypdf and langchain already imported
+    start = time.perf_counter()
+    page_count, chunks = paths[name](path, splitter)
+    elapsed = time.perf_counter() - start
+    return {'path': name, 'pages': page_count, 'chunks': len(chunks), 'seconds': elapsed,
+            'pages_per_sec': page_count / elapsed, 'baseline_rss_mb': baseline, 'peak_rss_mb': rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--lines', type=int, default=40, help="text lines per page")
+    parser.add_argument('--image-size', type=int, default=512, help="side of the per-page image, 0 for none")
+    parser.add_argument('--measure', nargs=2, metavar=('PATH_NAME', 'PDF'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, 'report.pdf')
+        size = write_pdf(pdf_path, args.pages, args.lines, args.image_size)
+        print(f"Synthetic report: {args.pages} pages, {size / (1024 * 1024):.1f} MB")
+        for name in paths:
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_extract', '--measure', name, pdf_path],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{name:>10}: {result['pages']} pages, {result['chunks']} chunks in {result['seconds']:.2f}s "
+                  f"({result['pages_per_sec']:.0f} pages/sec), peak RSS {result['peak_rss_mb']:.0f} MB "
+                  f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.0f} MB over imports)")
+
+if __name__ == "__main__":
+    main()
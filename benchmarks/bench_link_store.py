@@ -0,0 +1,71 @@
+"""Insert throughput: per-row INSERT + commit vs the batched LinkStore.
+
+    python -m benchmarks.bench_link_store [--count 100000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from link_store import LinkStore
+
+
+def synthetic_urls(count):
+    return [f"https://www.theccc.org.uk/wp-content/uploads/2023/09/report-{i:06d}.pdf" for i in range(count)]
+
+
+def per_row_path(db_path, urls):
+    """The original scraper path: SELECT to check, then INSERT and commit for every link."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS pdf_links (id INTEGER PRIMARY KEY, url TEXT UNIQUE)")
+    conn.commit()
+    for url in urls:
+        cursor.execute("SELECT 1 FROM pdf_links WHERE url=?", (url,))
+        if cursor.fetchone() is not None:
+            continue
+        try:
+            cursor.execute("INSERT INTO pdf_links (url) VALUES (?)", (url,))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            pass
+    conn.close()
+
+
+def batched_path(db_path, urls):
+    with LinkStore(db_path) as store:
+        for url in urls:
+            if url not in store:
+                store.add(url)
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM pdf_links").fetchone()[0]
+    conn.close()
+    return count
+
+
+def timed(label, func, db_path, urls):
+    start = time.perf_counter()
+    func(db_path, urls)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed:.2f}s, {len(urls) / elapsed:,.0f} links/s, {count_rows(db_path)} rows")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+
+    urls = synthetic_urls(args.count)
+    workdir = tempfile.mkdtemp()
+    old = timed("Per-row commit", per_row_path, os.path.join(workdir, 'per_row.db'), urls)
+    new = timed("Batched LinkStore", batched_path, os.path.join(workdir, 'batched.db'), urls)
+    print(f"Speed-up: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
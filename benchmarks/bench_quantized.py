@@ -0,0 +1,81 @@
+"""Memory vs recall of int8 scalar quantization with float32 re-ranking.
+
+Builds clustered synthetic vectors, quantizes them and compares every
+configuration with the exact float32 scan: the memory the first pass has
+to keep resident, the float32 bytes re-ranking reads per query, recall@k
+and latency:
+    python -m benchmarks.bench_quantized [--size 100000] [--dim 512] [--rerank 1 2 5 10]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_vector_store import clustered_vectors, percentile_ms
+from local_store import LocalVectorStore
+
+
+def measure(store, query_vectors, k):
+    timings, hits = [], []
+    for query in query_vectors:
+        start = time.perf_counter()
+        hits.append({row for row, _ in store.search_vector(query, k)})
+        timings.append(time.perf_counter() - start)
+    return timings, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=512, help="vector dimension (1536 for ada-002)")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, nargs='+', default=[1, 2, 5, 10],
+                        help="shortlist sizes to re-rank, as multiples of k")
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    store = LocalVectorStore(directory=directory, dimension=args.dim, quantized=False)
+    vectors = clustered_vectors(args.size, args.dim, clusters=max(10, args.size // 1000), rng=rng)
+    for start in range(0, args.size, 50_000):
+        store.upsert([(str(start + i), v, {}) for i, v in enumerate(vectors[start:start + 50_000])])
+    query_vectors = vectors[rng.choice(args.size, args.queries, replace=False)] + \
+        0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    del vectors
+
+    start = time.perf_counter()
+    store.quantize()
+    print(f"{args.size:,} x {args.dim} vectors, quantized in {time.perf_counter() - start:.1f}s")
+    float_mb = os.path.getsize(store.vectors_path) / 2 ** 20
+    code_mb = os.path.getsize(store.codes_path) / 2 ** 20
+
+    exact_timings, exact_hits = measure(store, query_vectors, args.k)
+    configurations = [('exact float32', float_mb, 0, exact_timings, exact_hits)]
+    store.quantized = True
+    for mode in ('exact', 'ivf'):
+        if mode == 'ivf':
+            store.build_ivf()
+        store.mode, store.nprobe = mode, args.nprobe
+        for rerank in args.rerank:
+            store.rerank = rerank
+            timings, hits = measure(store, query_vectors, args.k)
+            rerank_kb = args.k * rerank * args.dim * 4 / 1024
+            configurations.append((f"{'ivf + ' if mode == 'ivf' else ''}int8, re-rank {rerank}k", code_mb,
+                                   rerank_kb, timings, hits))
+
+    print(f"{'configuration':<26} {'scan MB':>8} {'re-rank KB/query':>17} {f'recall@{args.k}':>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for name, scan_mb, rerank_kb, timings, hits in configurations:
+        recall = np.mean([len(e & a) / args.k for e, a in zip(exact_hits, hits)])
+        print(f"{name:<26} {scan_mb:>8.0f} {rerank_kb:>17.0f} {recall:>10.3f} "
+              f"{percentile_ms(timings, 50):>8.2f} {percentile_ms(timings, 99):>8.2f}")
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
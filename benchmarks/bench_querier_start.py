@@ -0,0 +1,133 @@
+"""Querier cold start: import time and time to first answer, fresh process vs warm worker pool.
+
+Every number is the wall time of a new process, as when the querier is
+launched as a short-lived worker. Answers come from a local vector index
+with fake embeddings and a FakeLLM, so no network or API key is needed:
+    python -m benchmarks.bench_querier_start [--runs 5] [--workers 2]
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.pdf_fixture import words
+
+# What querier.py imported at load before its imports were made lazy
+eager_imports = ("import langchain.embeddings.openai, langchain.llms, langchain.chains.question_answering, "
+                 "langchain.prompts, langchain.memory, langchain.vectorstores, embedding_cache, local_store, "
+                 "answer_cache, context, bm25_index, hybrid, metrics")
+question = "What does the committee recommend for heat pumps?"
+dimension = 256
+
+
+def offline_backends(directory):
+    """querier.load_backends() stand-in: the local index with fake embeddings and a fake LLM."""
+    from benchmarks.fake_llm import FakeLLM
+    from embedder import FakeEmbeddings
+    from local_store import LocalVectorStore
+
+    return LocalVectorStore(embedding=FakeEmbeddings(dimension=dimension), directory=directory), None, FakeLLM(), None
+
+
+def build_index(directory, documents):
+    from embedder import FakeEmbeddings
+    from local_store import LocalVectorStore
+
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(words, k=60)) for _ in range(documents)]
+    store = LocalVectorStore(embedding=FakeEmbeddings(dimension=dimension), directory=directory)
+    vectors = store.embeddings.embed_documents(texts)
+    store.upsert([(f"doc-{i}", vector, {'text': text, 'source': f"report-{i % 50}.pdf"})
+                  for i, (vector, text) in enumerate(zip(vectors, texts))])
+
+
+def answer_cold(directory):
+    """Everything a fresh querier process does before its first answer."""
+    import querier
+
+    docsearch, lexical, llm, namespace = offline_backends(directory)
+    chain = querier.setup_llm(None, llm=llm)
+    querier.answer_question(docsearch, chain, namespace, question, lexical=lexical)
+
+
+def wall_times(command, runs):
+    """Median wall time of running command in a new process, in seconds."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def wait_for_pool(path, timeout=60):
+    import querier
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return next(querier.ask([question], path))
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--cold', metavar='INDEX_DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--serve', nargs=2, metavar=('INDEX_DIR', 'SOCKET'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold:
+        answer_cold(args.cold)
+        return
+    if args.serve:
+        import querier
+
+        directory, path = args.serve
+        querier.serve_pool(path, args.workers, setup=lambda: offline_backends(directory))
+        return
+
+    os.environ['VECTOR_BACKEND'] = 'local'
+    python = sys.executable
+    with tempfile.TemporaryDirectory() as workdir:
+        directory, path = os.path.join(workdir, 'vectors'), os.path.join(workdir, 'querier.sock')
+        build_index(directory, args.documents)
+        results = {
+            'interpreter': wall_times([python, '-c', 'pass'], args.runs),
+            'import eager': wall_times([python, '-c', eager_imports], args.runs),
+            'import querier': wall_times([python, '-c', 'import querier'], args.runs),
+            'first answer, cold process': wall_times([python, '-m', 'benchmarks.bench_querier_start',
+                                                      '--cold', directory], args.runs),
+        }
+        pool = subprocess.Popen([python, '-m', 'benchmarks.bench_querier_start', '--workers', str(args.workers),
+                                 '--serve', directory, path], stderr=subprocess.DEVNULL)
+        try:
+            start = time.perf_counter()
+            wait_for_pool(path)
+            print(f"Pool of {args.workers} workers ready in {time.perf_counter() - start:.2f}s")
+            results['first answer, warm pool'] = wall_times(
+                [python, 'querier.py', '--socket', path, '--ask', question], args.runs)
+        finally:
+            pool.send_signal(signal.SIGINT)
+            pool.wait()
+
+    for name, seconds in results.items():
+        print(f"{name:>28}: {seconds * 1000:7.0f} ms")
+    print(f"Importing the querier is {results['import eager'] / results['import querier']:.0f}x faster; "
+          f"a pooled answer arrives {results['first answer, cold process'] / results['first answer, warm pool']:.0f}x "
+          f"sooner than from a cold process")
+
+
+if __name__ == "__main__":
+    main()
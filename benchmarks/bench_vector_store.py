@@ -0,0 +1,76 @@
+"""Recall and latency of the local vector store: exact scan vs IVF.
+
+Builds clustered synthetic vectors at each size, then measures query
+latency percentiles and recall@k of IVF against the exact scan:
+    python -m benchmarks.bench_vector_store [--sizes 10000 100000 1000000] [--dim 256]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from local_store import LocalVectorStore
+
+
+def clustered_vectors(count, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def run(size, dim, queries, k, nprobe, rng):
+    directory = tempfile.mkdtemp()
+    store = LocalVectorStore(directory=directory, dimension=dim)
+    vectors = clustered_vectors(size, dim, clusters=max(10, size // 1000), rng=rng)
+    for start in range(0, size, 50_000):
+        block = vectors[start:start + 50_000]
+        store.upsert([(str(start + i), v, {}) for i, v in enumerate(block)])
+    query_vectors = vectors[rng.choice(size, queries, replace=False)] + \
+        0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+
+    results = {}
+    for mode in ('exact', 'ivf'):
+        if mode == 'ivf':
+            start = time.perf_counter()
+            store.build_ivf()
+            build_time = time.perf_counter() - start
+        store.mode, store.nprobe = mode, nprobe
+        timings, hits = [], []
+        for query in query_vectors:
+            start = time.perf_counter()
+            hits.append({row for row, _ in store.search_vector(query, k)})
+            timings.append(time.perf_counter() - start)
+        results[mode] = (timings, hits)
+
+    exact_hits, ivf_hits = results['exact'][1], results['ivf'][1]
+    recall = np.mean([len(e & a) / k for e, a in zip(exact_hits, ivf_hits)])
+    for mode in ('exact', 'ivf'):
+        timings = results[mode][0]
+        extra = f", recall@{k} {recall:.3f}, build {build_time:.1f}s" if mode == 'ivf' else ""
+        print(f"{size:>9,} vectors  {mode:<5}  p50 {percentile_ms(timings, 50):7.2f} ms  "
+              f"p99 {percentile_ms(timings, 99):7.2f} ms{extra}")
+    shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=256,
+                        help="vector dimension (1536 for ada-002; 1M x 1536 needs ~6 GB of disk)")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        run(size, args.dim, args.queries, args.k, args.nprobe, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Deterministic offline LLM for latency benchmarks of the QA chain."""
+import hashlib
+import time
+from typing import Any, List, Optional
+
+from langchain.llms.base import LLM
+
+from embedder import count_tokens
+
+words = ("the committee recommends faster delivery of heat pumps electric vehicles and "
+         "low carbon electricity to stay on track for net zero").split()
+
+
+class FakeLLM(LLM):
+    """Answers with words picked from a hash of the prompt after a simulated round trip.
+
+    latency is the time to the first token, token_latency the time per further
+    token, so generation cost grows with answer_tokens like a real completion.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 30
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def get_num_tokens(self, text: str) -> int:
+        # The summary memory counts history tokens; the base class would need transformers
+        return count_tokens(text)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep(self.latency + self.token_latency * max(0, self.answer_tokens - 1))
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return " ".join(words[digest[i % len(digest)] % len(words)] for i in range(self.answer_tokens))
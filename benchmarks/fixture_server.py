@@ -0,0 +1,156 @@
+"""Local stand-in for www.theccc.org.uk used to benchmark the crawler offline.
+
+Serves the same URL shapes the scraper walks:
+  /publications/page/<n>/         listing page linking to publication pages
+  /publication/<slug>/            publication page linking to PDFs
+  /wp-content/uploads/<y>/<m>/... PDF bodies (synthetic reports when pdf_pages > 0)
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fixture shape (mirrors the real site: 33 listing pages, ~1,300 PDFs)
+total_pages = 33
+publications_per_page = 12
+pdfs_per_publication = 3
+latency = 0.05          # seconds added to every response to emulate a round trip
+throttle_every = 0      # answer every Nth request with 429 + Retry-After (0 disables)
+retry_after = 0.2
+new_publications = 0    # extra publications listed at the top of page 1 (simulates new uploads)
+pdf_pages = 0           # pages per served PDF; 0 serves an empty placeholder
+pdf_bodies = {}         # path -> generated PDF, built on first request
+
+
+def publication_slug(page_number, position):
+    return f"report-{page_number:02d}-{position:02d}"
+
+
+def pdf_path(slug, number):
+    return f"/wp-content/uploads/2023/09/{slug}-{number}.pdf"
+
+
+def listing_slugs(page_number):
+    slugs = [publication_slug(page_number, i) for i in range(publications_per_page)]
+    if page_number == 1:
+        slugs = [f"new-report-{i:02d}" for i in range(new_publications)] + slugs
+    return slugs
+
+
+def listing_html(base, page_number):
+    links = "\n".join(
+        f'<a href="{base}/publication/{slug}/">{slug}</a>' for slug in listing_slugs(page_number)
+    )
+    return f"<html><body><a href=\"{base}/about/\">About</a>\n{links}</body></html>"
+
+
+def publication_html(base, slug):
+    links = "\n".join(
+        f'<a href="{base}{pdf_path(slug, j)}">Download</a>' for j in range(pdfs_per_publication)
+    )
+    return f"<html><body><h1>{slug}</h1>\n{links}</body></html>"
+
+
+def pdf_body(path):
+    """A synthetic report for a PDF path, seeded by the path so every document differs."""
+    if not pdf_pages:
+        return b"%PDF-1.4\n%%EOF\n"
+    if path not in pdf_bodies:
+        from benchmarks.pdf_fixture import write_pdf
+
+        seed = int(hashlib.md5(path.encode()).hexdigest()[:8], 16)
+        fd, tmp_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            write_pdf(tmp_path, pdf_pages, seed=seed)
+            with open(tmp_path, 'rb') as f:
+                pdf_bodies[path] = f.read()
+        finally:
+            os.remove(tmp_path)
+    return pdf_bodies[path]
+
+
+def expected_pdf_links(base):
+    """Every PDF URL the fixture site exposes."""
+    return {
+        f"{base}{pdf_path(slug, j)}"
+        for page in range(1, total_pages + 1)
+        for slug in listing_slugs(page)
+        for j in range(pdfs_per_publication)
+    }
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is measurable
+    request_count = 0
+    count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='text/html', headers=None):
+        data = body.encode() if isinstance(body, str) else body
+        if status == 200:
+            # Strong validator so conditional re-crawls can be answered with 304
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def do_GET(self):
+        with FixtureHandler.count_lock:
+            FixtureHandler.request_count += 1
+            count = FixtureHandler.request_count
+        time.sleep(latency)
+        if throttle_every and count % throttle_every == 0:
+            self.send_body(429, "slow down", headers={'Retry-After': str(retry_after)})
+            return
+
+        base = f"http://{self.headers['Host']}"
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if len(parts) == 3 and parts[:2] == ['publications', 'page'] and parts[2].isdigit():
+            page_number = int(parts[2])
+            if 1 <= page_number <= total_pages:
+                self.send_body(200, listing_html(base, page_number))
+                return
+        elif len(parts) == 2 and parts[0] == 'publication':
+            self.send_body(200, publication_html(base, parts[1]))
+            return
+        elif parts and parts[0] == 'wp-content' and parts[-1].endswith('.pdf'):
+            self.send_body(200, pdf_body(self.path.split('?')[0]), content_type='application/pdf')
+            return
+        self.send_body(404, "not found")
+
+    do_HEAD = do_GET
+
+
+def start_server(port=0):
+    """Start the fixture server on a background thread and return (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    server, base = start_server(8765)
+    print(f"Fixture site running at {base}/publications (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
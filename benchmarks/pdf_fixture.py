@@ -0,0 +1,66 @@
+"""Synthetic PDFs for offline extraction benchmarks.
+
+The files are written object by object, so a multi-hundred-page report with
+an image on every page never has to fit in memory while it is generated.
+"""
+import random
+
+words = ("net zero carbon budget CB6 MtCO2e ZEV mandate emissions heat pumps surface transport "
+         "buildings agriculture land use progress report recommendations Parliament policy delivery "
+         "electricity supply hydrogen aviation shipping waste F-gases adaptation risk").split()
+
+
+def page_text(rng, number, lines):
+    return [f"Page {number} line {line}: " + " ".join(rng.choice(words) for _ in range(12))
+            for line in range(lines)]
+
+
+def write_pdf(path, pages, lines_per_page=40, image_size=0, seed=0):
+    """Write a pages-long PDF with lines_per_page lines of text per page.
+
+    With image_size > 0 every page also draws its own image_size x image_size
+    greyscale image, which makes the file about image_size ** 2 bytes per page,
+    like the charts and photos in the CCC progress reports.
+    Returns the file size in bytes.
+    """
+    rng = random.Random(seed)
+    per_page = 3 if image_size else 2
+    font_id = 3 + per_page * pages
+    offsets = []
+
+    with open(path, 'wb') as f:
+        def write_object(body):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % len(offsets) + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{3 + per_page * i} 0 R" for i in range(pages))
+        write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        for number in range(pages):
+            page_id = 3 + per_page * number
+            resources = f"/Font << /F1 {font_id} 0 R >>"
+            operations = ["BT /F1 10 Tf 12 TL 50 760 Td"]
+            for line in page_text(rng, number, lines_per_page):
+                operations.append(f"({line}) Tj T*")
+            operations.append("ET")
+            if image_size:
+                resources += f" /XObject << /Im1 {page_id + 2} 0 R >>"
+                operations.append("q 200 0 0 200 200 100 cm /Im1 Do Q")
+            stream = "\n".join(operations).encode()
+            write_object(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                         f"/Resources << {resources} >> /Contents {page_id + 1} 0 R >>".encode())
+            write_object(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            if image_size:
+                pixels = rng.randbytes(image_size * image_size)
+                write_object(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                             b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (image_size, image_size, len(pixels))
+                             + pixels + b"\nendstream")
+        write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+        return f.tell()
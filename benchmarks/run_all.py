@@ -0,0 +1,199 @@
+"""Offline benchmark suite: crawl, ingestion and query latency, written as JSON.
+
+Everything runs against local fixtures: the fixture site serves listing and
+publication pages and synthetic PDF reports, embeddings come from
+FakeEmbeddings and answers from a deterministic FakeLLM, so no network or
+API key is needed:
+    python -m benchmarks.run_all [--output results.json]
+    python -m benchmarks.run_all --compare before.json after.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks import bench_crawl, fixture_server
+from benchmarks.pdf_fixture import words
+
+# Metrics where a lower value is better; *_per_sec and speedup are better higher
+lower_is_better = ('_s', '_ms', '_requests', '_mb')
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {'p50_ms': float(np.percentile(samples, 50)), 'p95_ms': float(np.percentile(samples, 95)),
+            'p99_ms': float(np.percentile(samples, 99))}
+
+
+def bench_ingest(args, workdir):
+    """Download, extract and chunk synthetic reports through the ingestion pipeline, cold then cached."""
+    import ingest
+    from embedder import EmbeddingStage, FakeEmbeddings
+
+    fixture_server.latency = args.latency
+    fixture_server.pdf_pages = args.pdf_pages
+    server, base = fixture_server.start_server()
+    urls = [f"{base}{fixture_server.pdf_path(f'bench-{i:03d}', 0)}" for i in range(args.pdfs)]
+    cache_directory = os.path.join(workdir, 'pdf_cache')
+    documents = []
+    results = {}
+    for run in ('cold', 'cached'):
+        consume = (lambda url, sha256, chunks: documents.append(chunks)) if run == 'cold' else None
+        stats = ingest.ingest_corpus(urls, consume=consume, workers=args.workers, cache_directory=cache_directory)
+        results[run] = {'documents': stats['documents'], 'failed': stats['failed'], 'pages': stats['pages'],
+                        'chunks': stats['chunks'], 'elapsed_s': stats['elapsed'],
+                        'pages_per_sec': stats['pages'] / stats['elapsed'],
+                        'chunks_per_sec': stats['chunks'] / stats['elapsed']}
+    server.shutdown()
+
+    chunks = [chunk for document in documents for chunk in document]
+    stage = EmbeddingStage(FakeEmbeddings(dimension=args.dim, latency=args.embed_latency))
+    start = time.perf_counter()
+    vectors = stage.embed([chunk.page_content for chunk in chunks])
+    elapsed = time.perf_counter() - start
+    stage.close()
+    results['embed'] = {'chunks': len(chunks), 'requests': stage.stats['requests'], 'elapsed_s': elapsed,
+                        'chunks_per_sec': len(chunks) / elapsed}
+    return results, chunks, vectors
+
+
+def bench_query(args, workdir, chunks, vectors):
+    """Retrieval and end-to-end answer latency of the querier over the ingested chunks."""
+    import querier
+    from benchmarks.fake_llm import FakeLLM
+    from bm25_index import BM25Index
+    from embedder import FakeEmbeddings
+    from hybrid import hybrid_search
+    from local_store import LocalVectorStore
+    from vector_sync import assign_chunk_ids
+
+    logging.getLogger().setLevel(logging.WARNING)  # the querier logs every turn
+    store = LocalVectorStore(embedding=FakeEmbeddings(dimension=args.dim), directory=os.path.join(workdir, 'vectors'))
+    ids = assign_chunk_ids(chunks)
+    store.upsert([(chunk_id, vector, dict(chunk.metadata, text=chunk.page_content))
+                  for chunk_id, vector, chunk in zip(ids, vectors, chunks)])
+    lexical = BM25Index(os.path.join(workdir, 'bm25.db'))
+    lexical.add(chunks)
+    chain = querier.setup_llm(None, llm=FakeLLM(latency=args.llm_latency, token_latency=args.llm_token_latency))
+
+    rng = random.Random(0)
+    questions = [f"What does the committee say about {' '.join(rng.sample(words, 3))}?"
+                 for _ in range(args.questions)]
+    timings = {'retrieve_vector': [], 'retrieve_hybrid': [], 'answer': []}
+    for question in questions:
+        start = time.perf_counter()
+        hybrid_search(store, None, question)
+        timings['retrieve_vector'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hybrid_search(store, lexical, question)
+        timings['retrieve_hybrid'].append(time.perf_counter() - start)
+    for question in questions:
+        start = time.perf_counter()
+        querier.answer_question(store, chain, None, question, lexical=lexical)
+        timings['answer'].append(time.perf_counter() - start)
+    lexical.close()
+    results = {name: percentiles(samples) for name, samples in timings.items()}
+    results['questions'] = len(questions)
+    results['vectors'] = len(ids)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(before, after, threshold):
+    """Print every metric's change between two result files; return the regressions."""
+    old, new = flatten(before['results']), flatten(after['results'])
+    print(f"{'metric':<44} {before.get('commit') or 'before':>12} {after.get('commit') or 'after':>12} {'change':>8}")
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] if old[name] else 0.0
+        if name.endswith(lower_is_better):
+            worse = change > threshold
+        elif name.endswith(('_per_sec', 'speedup')):
+            worse = change < -threshold
+        else:
+            worse = False  # counts describe the workload, not its speed
+        if worse:
+            regressions.append(name)
+        print(f"{name:<44} {old[name]:>12.4g} {new[name]:>12.4g} {change:>+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help="compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument('--latency', type=float, default=0.01, help="fixture site round trip, seconds")
+    parser.add_argument('--crawl-pages', type=int, default=10)
+    parser.add_argument('--pdfs', type=int, default=24)
+    parser.add_argument('--pdf-pages', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--embed-latency', type=float, default=0.02)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="fake LLM time to first token")
+    parser.add_argument('--llm-token-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        regressions = compare(before, after, args.threshold)
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    workdir = tempfile.mkdtemp(prefix='ccc-bench-')
+    results = {}
+    print("Crawl ...")
+    results['crawl'] = bench_crawl.run(args.latency, args.crawl_pages, workers=16, host_limit=8)
+    print("Ingest ...")
+    results['ingest'], chunks, vectors = bench_ingest(args, workdir)
+    print("Query ...")
+    results['query'] = bench_query(args, workdir, chunks, vectors)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, value in flatten(results).items():
+        print(f"{name:<44} {value:.4g}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from langchain.schema import Document
+
+from link_store import connect
+from local_store import filter_columns, filter_sql
+
+index_path = os.getenv('BM25_INDEX_DB', 'bm25.db')
+k1 = 1.2
+b = 0.75
+
+# Keeps policy identifiers intact: "CB6", "MtCO2e", "net-zero", "1.5"
+token_pattern = re.compile(r"[a-z0-9]+(?:[-.'][a-z0-9]+)*")
+stop_words = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with"
+    .split())
+
+
+def tokenize(text):
+    return [token for token in token_pattern.findall(text.lower()) if token not in stop_words]
+
+
+class BM25Index:
+    """On-disk BM25 inverted index over chunks, stored in SQLite.
+
+    Postings are (term, chunk, term frequency) rows; document frequencies and
+    corpus statistics are updated as chunks are added or deleted, so new PDFs
+    are indexed incrementally without a rebuild.
+    """
+
+    def __init__(self, path=None):
+        # Shared by the chat server's retrieval threads
+        self.conn = connect(path or index_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY,
+            chunk_id TEXT UNIQUE NOT NULL,
+            length INTEGER NOT NULL,
+            text TEXT,
+            metadata TEXT,
+            {', '.join(f"{column} {column_type}" for column, column_type in filter_columns.items())}
+        );
+        CREATE TABLE IF NOT EXISTS terms (
+            term TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            chunk INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, chunk)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk);
+        CREATE TABLE IF NOT EXISTS corpus (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO corpus (key, value) VALUES ('chunks', 0), ('total_length', 0);
+        ''')
+        self.conn.commit()
+
+    def corpus_stats(self):
+        stats = dict(self.conn.execute("SELECT key, value FROM corpus"))
+        return stats['chunks'], stats['total_length']
+
+    def remove_chunks(self, rows):
+        """Take chunks (by internal id) out of the postings and statistics; no commit."""
+        for row, length in rows:
+            terms = [term for (term,) in self.conn.execute("SELECT term FROM postings WHERE chunk=?", (row,))]
+            self.conn.executemany("UPDATE terms SET df = df - 1 WHERE term=?", [(term,) for term in terms])
+            self.conn.execute("DELETE FROM postings WHERE chunk=?", (row,))
+            self.conn.execute("DELETE FROM chunks WHERE id=?", (row,))
+            self.conn.execute("UPDATE corpus SET value = value - 1 WHERE key='chunks'")
+            self.conn.execute("UPDATE corpus SET value = value - ? WHERE key='total_length'", (length,))
+        self.conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def add(self, chunks):
+        """Index chunks (Documents with a chunk_id in their metadata).
+
+        Chunks already indexed with the same text are skipped; changed ones replace the old version.
+        """
+        with self.lock, self.conn:
+            for chunk in chunks:
+                metadata = dict(chunk.metadata)
+                chunk_id = metadata['chunk_id']
+                existing = self.conn.execute(
+                    "SELECT id, length, text FROM chunks WHERE chunk_id=?", (chunk_id,)).fetchone()
+                if existing is not None:
+                    if existing[2] == chunk.page_content:
+                        continue
+                    self.remove_chunks([existing[:2]])
+                counts = Counter(tokenize(chunk.page_content))
+                length = sum(counts.values())
+                cursor = self.conn.execute(
+                    f"INSERT INTO chunks (chunk_id, length, text, metadata, {', '.join(filter_columns)}) "
+                    f"VALUES (?, ?, ?, ?, {', '.join('?' * len(filter_columns))})",
+                    (chunk_id, length, chunk.page_content, json.dumps(metadata),
+                     *(metadata.get(column) for column in filter_columns)))
+                row = cursor.lastrowid
+                self.conn.executemany("INSERT INTO postings (term, chunk, tf) VALUES (?, ?, ?)",
+                                      [(term, row, tf) for term, tf in counts.items()])
+                self.conn.executemany('''
+                INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1
+                ''', [(term,) for term in counts])
+                self.conn.execute("UPDATE corpus SET value = value + 1 WHERE key='chunks'")
+                self.conn.execute("UPDATE corpus SET value = value + ? WHERE key='total_length'", (length,))
+
+    def delete(self, ids, namespace=None):
+        """Remove chunks by chunk_id (same signature as the vector indexes' delete)."""
+        with self.lock, self.conn:
+            for chunk_id in ids:
+                self.remove_chunks(self.conn.execute(
+                    "SELECT id, length FROM chunks WHERE chunk_id=?", (chunk_id,)).fetchall())
+
+    def search(self, query, k=4, search_filter=None):
+        """Top-k (Document, BM25 score) pairs for a query."""
+        with self.lock:
+            return self.score(query, k, search_filter)
+
+    def score(self, query, k, search_filter):
+        chunk_count, total_length = self.corpus_stats()
+        if not chunk_count:
+            return []
+        average_length = total_length / chunk_count
+        condition, params = filter_sql(search_filter or {})
+        scores = {}
+        for term in set(tokenize(query)):
+            row = self.conn.execute("SELECT df FROM terms WHERE term=?", (term,)).fetchone()
+            if row is None:
+                continue
+            df = row[0]
+            idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            for chunk, tf, length in self.conn.execute(f'''
+            SELECT postings.chunk, postings.tf, chunks.length FROM postings
+            JOIN chunks ON chunks.id = postings.chunk
+            WHERE postings.term=? AND {condition}
+            ''', [term, *params]):
+                norm = tf + k1 * (1 - b + b * length / average_length)
+                scores[chunk] = scores.get(chunk, 0.0) + idf * tf * (k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not best:
+            return []
+        found = {
+            row: Document(page_content=text or '', metadata=json.loads(metadata))
+            for row, text, metadata in self.conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(best))})",
+                [row for row, _ in best])
+        }
+        return [(found[row], score) for row, score in best]
+
+    def close(self):
+        self.conn.close()
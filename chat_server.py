@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from answer_cache import AnswerCache, document_ids
+from context import assemble_context, prompt_tokens
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+max_sessions = int(os.getenv('CHAT_MAX_SESSIONS', '1000'))
+retrieval_threads = int(os.getenv('CHAT_RETRIEVAL_THREADS', '16'))
+max_body_bytes = 64 * 1024
+
+
+class LangchainBackend:
+    """Retrieval and streaming generation over the querier's search index and QA chain.
+
+    The embeddings, vector index and LLM clients are created once and shared
+    by every session; each session only owns its chain (and so its memory).
+    Old turns are summarized with a separate non-streaming client on a worker
+    thread, so a session's summary call never stalls other sessions' streams.
+    """
+
+    def __init__(self, search_filter=None):
+        import querier
+
+        openai_api_key, pinecone_api_key, pinecone_env, namespace = querier.initialize_environment()
+        self.querier = querier
+        self.openai_api_key = openai_api_key
+        self.namespace = namespace
+        self.search_filter = search_filter
+        self.docsearch = querier.setup_search(pinecone_api_key, pinecone_env, namespace)
+        self.lexical = querier.setup_lexical()
+        self.llm = querier.llm_client(openai_api_key, streaming=True)
+        self.summary_llm = querier.llm_client(openai_api_key)
+        self.answer_cache = AnswerCache()
+
+    def new_session(self):
+        return self.querier.setup_llm(self.openai_api_key, llm=self.llm, summary_llm=self.summary_llm,
+                                      defer_summary=True)
+
+    def retrieve(self, question):
+        """Blocking retrieval; the server runs it on a thread pool."""
+        with metrics.timer('embed_query'):
+            vector = self.docsearch.embeddings.embed_query(question)
+        docs = self.querier.hybrid_search(self.docsearch, self.lexical, question, namespace=self.namespace,
+                                          search_filter=self.search_filter, query_vector=vector)
+        return vector, docs
+
+    async def stream_answer(self, chain, question, retrieved):
+        from langchain.callbacks import AsyncIteratorCallbackHandler
+
+        vector, docs = retrieved
+        doc_ids = document_ids(docs)
+        # The cache key ignores the conversation, so only first turns use the cache
+        cacheable = not self.querier.has_history(chain.memory)
+        cached = self.answer_cache.lookup(vector, doc_ids) if cacheable else None
+        if cached is not None:
+            chain.memory.save_context({'human_input': question}, {'output_text': cached})
+            yield cached
+            await asyncio.get_running_loop().run_in_executor(None, chain.memory.prune)
+            return
+        handler = AsyncIteratorCallbackHandler()
+        context_docs = assemble_context(docs)
+        metrics.inc('tokens_total', prompt_tokens(context_docs, chain.memory, question), kind='prompt')
+        task = asyncio.create_task(chain.arun(input_documents=context_docs, question=question,
+                                              human_input=question, callbacks=[handler]))
+        try:
+            with metrics.timer('generate'):
+                # Wait on the chain as well as the next token: a chain that fails before the LLM starts never
+                # signals the handler, and handler.aiter() would wait forever
+                streamed = False
+                while True:
+                    token = asyncio.ensure_future(handler.queue.get())
+                    await asyncio.wait({token, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if not token.done():
+                        token.cancel()
+                        break
+                    streamed = True
+                    yield token.result()
+                while not handler.queue.empty():
+                    streamed = True
+                    yield handler.queue.get_nowait()
+                answer = await task  # raises the chain's error, if any
+                if not streamed:
+                    yield answer  # an LLM that does not stream answers in one piece
+        finally:
+            # The client went away or the chain failed: don't leave generation running unobserved
+            if not task.done():
+                task.cancel()
+        if cacheable:
+            self.answer_cache.store(vector, doc_ids, answer)
+        # save_context only recorded the turn; summarizing old turns is an LLM call, kept off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, chain.memory.prune)
+
+
+class StubBackend:
+    """Offline backend with fixed retrieval and per-token latencies, for load tests."""
+
+    def __init__(self, retrieval_latency=0.05, first_token_latency=0.2, token_latency=0.02, answer_tokens=40):
+        self.retrieval_latency = retrieval_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+
+    def new_session(self):
+        return []  # the session's history
+
+    def retrieve(self, question):
+        time.sleep(self.retrieval_latency)  # blocking, like a real embedding + vector search call
+        return question
+
+    async def stream_answer(self, history, question, retrieved):
+        await asyncio.sleep(self.first_token_latency)
+        for i in range(self.answer_tokens):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield f" token{i}"
+        history.append(question)
+
+
+class ChatServer:
+    """Asyncio HTTP server streaming answers as Server-Sent Events.
+
+    POST /chat with {"session_id": ..., "question": ...} streams
+    `data: {"token": ...}` events and a final `event: done`. Each session has
+    its own memory and answers its turns in order; different sessions run
+    concurrently, so one request's retrieval overlaps another's generation.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sessions = OrderedDict()  # session_id -> (lock, chain), least recently used first
+        self.executor = ThreadPoolExecutor(max_workers=retrieval_threads)
+
+    def session(self, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = (asyncio.Lock(), self.backend.new_session())
+            while len(self.sessions) > max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        return self.sessions[session_id]
+
+    async def read_request(self, reader):
+        """(method, path, headers, body), or None if the client sent nothing; ValueError if malformed."""
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            return None
+        parts = request_line.split(' ', 2)
+        if len(parts) != 3:
+            raise ValueError(f"malformed request line: {request_line[:100]!r}")
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))  # ValueError if not a number
+        if length < 0:
+            raise ValueError(f"negative Content-Length: {length}")
+        length = min(length, max_body_bytes)
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                request = await self.read_request(reader)
+            except ValueError as e:  # also raised by readline for lines over the stream limit
+                await self.respond(writer, '400 Bad Request', {'error': str(e)})
+                return
+            if request is None:
+                return
+            method, path, _, body = request
+            if method == 'GET' and path == '/health':
+                await self.respond(writer, '200 OK', {'status': 'ok', 'sessions': len(self.sessions)})
+            elif method == 'GET' and path == '/metrics':
+                body = metrics.registry.prometheus().encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+                await writer.drain()
+            elif method == 'GET' and path == '/metrics.json':
+                await self.respond(writer, '200 OK', metrics.registry.summary())
+            elif method == 'POST' and path == '/chat':
+                try:
+                    message = json.loads(body or b'{}')
+                except ValueError:
+                    message = None
+                if not (isinstance(message, dict) and 'session_id' in message
+                        and isinstance(message.get('question'), str) and message['question'].strip()):
+                    await self.respond(writer, '400 Bad Request', {'error': 'expected session_id and question'})
+                    return
+                session_id, question = str(message['session_id']), message['question']
+                await self.chat(writer, session_id, question)
+            else:
+                await self.respond(writer, '404 Not Found', {'error': 'not found'})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def chat(self, writer, session_id, question):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        lock, chain = self.session(session_id)
+        loop = asyncio.get_running_loop()
+        async with lock:
+            started = time.perf_counter()
+            try:
+                with metrics.timer('retrieve'):
+                    retrieved = await loop.run_in_executor(self.executor, self.backend.retrieve, question)
+                first = True
+                stream = self.backend.stream_answer(chain, question, retrieved)
+                try:
+                    async for token in stream:
+                        if first:
+                            metrics.observe('stage_seconds', time.perf_counter() - started, stage='first_token')
+                            first = False
+                        writer.write(f"data: {json.dumps({'token': token})}\n\n".encode())
+                        await writer.drain()
+                finally:
+                    await stream.aclose()  # a disconnected client stops generation now, not at garbage collection
+                writer.write(b"event: done\ndata: {}\n\n")
+                metrics.observe('stage_seconds', time.perf_counter() - started, stage='turn')
+            except ConnectionError:
+                raise
+            except Exception as e:
+                logging.error(f"Failed to answer for session {session_id}: {e}")
+                writer.write(f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode())
+            await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """Start listening and return the asyncio server."""
+        return await asyncio.start_server(self.handle, host, port, limit=max_body_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the CCC chat over HTTP with streamed answers.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--stub', action='store_true', help="use the offline stub backend")
+    args = parser.parse_args()
+
+    async def run():
+        backend = StubBackend() if args.stub else LangchainBackend()
+        server = await ChatServer(backend).serve(args.host, args.port)
+        logging.info(f"Chat server listening on http://{args.host}:{args.port}/chat")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+
+from langchain.schema import Document
+
+from embedder import count_tokens
+
+context_token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))  # retrieved text per prompt
+history_token_budget = int(os.getenv('HISTORY_TOKEN_BUDGET', '500'))   # verbatim chat history per prompt
+
+
+def merge_chunks(docs):
+    """Drop duplicate chunks and merge overlapping or neighbouring chunks from the same page.
+
+    The splitter's 50-character chunk_overlap means neighbouring hits repeat
+    text; chunks are merged on their start_index so that text is sent once.
+    Merged documents keep the rank of their best-ranked chunk.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get('source'), doc.metadata.get('page'))
+        groups.setdefault(key, []).append((rank, doc))
+
+    merged = []
+    for members in groups.values():
+        spans = []  # [best rank, start, text, metadata]
+        positioned = all('start_index' in doc.metadata for _, doc in members)
+        if positioned:
+            members.sort(key=lambda member: member[1].metadata['start_index'])
+        for rank, doc in members:
+            text = doc.page_content
+            if positioned and spans:
+                previous = spans[-1]
+                start = doc.metadata['start_index']
+                end = previous[1] + len(previous[2])
+                if start <= end:
+                    # Overlapping or touching: append only the part not already covered
+                    previous[2] += text[end - start:]
+                    previous[0] = min(previous[0], rank)
+                    continue
+            if any(text in span[2] for span in spans):
+                continue  # exact duplicate or contained in an earlier chunk
+            start = doc.metadata.get('start_index', 0)
+            spans.append([rank, start, text, dict(doc.metadata)])
+        merged.extend(spans)
+
+    merged.sort(key=lambda span: span[0])
+    return [Document(page_content=text, metadata=metadata) for _, _, text, metadata in merged]
+
+
+def assemble_context(docs, max_tokens=None):
+    """Merge retrieved chunks and keep the best-ranked ones that fit the token budget."""
+    max_tokens = context_token_budget if max_tokens is None else max_tokens
+    selected, used = [], 0
+    for doc in merge_chunks(docs):
+        tokens = count_tokens(doc.page_content)
+        if used + tokens > max_tokens and selected:
+            break
+        selected.append(doc)
+        used += tokens
+    return selected
+
+
+def prompt_tokens(docs, memory, question):
+    """Approximate prompt size of a turn: context, chat history and question."""
+    history = memory.load_memory_variables({}).get(memory.memory_key, '')
+    return sum(count_tokens(doc.page_content) for doc in docs) + count_tokens(str(history)) + count_tokens(question)
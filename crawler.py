@@ -0,0 +1,148 @@
+import argparse
+import hashlib  # content hashes for change detection
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests  # for making HTTP requests
+from bs4 import BeautifulSoup  # for parsing HTML
+
+from http_client import HostLimiter, create_session, fetch  # pooled, rate-limited fetching
+import metrics
+import scraper  # reuse the link extractors and the pdf_links table
+
+# Crawl settings
+max_workers = 16       # threads fetching pages at the same time
+per_host_limit = 8     # concurrent requests allowed against a single host
+
+
+def fetch_page(session, limiter, url, headers=None):
+    """Fetch a page and return (response, soup); soup is None when the server answers 304."""
+    response = fetch(session, limiter, url, headers=headers)
+    if response.status_code == 304:
+        metrics.inc('not_modified_total')
+        return response, None
+    with metrics.timer('parse'):
+        return response, BeautifulSoup(response.content, 'html.parser')
+
+
+def record_page(url, kind, response):
+    """Save the page's validators and content hash; return True if it changed since the last crawl."""
+    previous = scraper.get_crawl_state(url)
+    if response.status_code == 304:
+        scraper.record_crawl_state(url, kind)
+        return False
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    scraper.record_crawl_state(url, kind,
+                               etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'),
+                               content_hash=content_hash)
+    return previous is None or previous['content_hash'] != content_hash
+
+
+def collect_all_pdf_links_concurrent(base_url, total_pages, workers=None, host_limit=None, incremental=False):
+    """Concurrent counterpart of scraper.collect_all_pdf_links.
+
+    Listing pages and publication pages are fetched at the same time from a
+    shared pool; results are written to links.db from the calling thread only.
+    Publication pages are requested conditionally and fall back to the PDFs
+    recorded in crawl_state when they have not changed.
+
+    With incremental=True listing pages are walked newest first, and pagination
+    stops at the first page that is unchanged or links to a known publication,
+    so a re-crawl with nothing new costs a single request. The known
+    publications on the pages that were walked are still re-requested
+    conditionally, so their edits are not missed.
+    """
+    workers = workers or max_workers
+    limiter = HostLimiter(host_limit or per_host_limit)
+    session = create_session(workers)
+    all_pdf_links = []
+    seen_publications = set()
+    pending = {}
+
+    def listing_url(page_number):
+        return f"{base_url}/page/{page_number}/?topic&type=0-report"
+
+    def submit(kind, url, page_number=None, conditional=True):
+        headers = scraper.conditional_headers(url) if conditional else None
+        future = executor.submit(fetch_page, session, limiter, url, headers)
+        pending[future] = (kind, url, page_number)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if incremental:
+            print(f"Scraping page: {listing_url(1)}")
+            submit('listing', listing_url(1), 1)
+        else:
+            for page_number in range(1, total_pages + 1):
+                page_url = listing_url(page_number)
+                if scraper.is_link_in_db(page_url):
+                    print(f"Skipping already scraped page: {page_url}")
+                    continue
+                print(f"Scraping page: {page_url}")
+                # Full crawls always need the listing body to discover publications
+                submit('listing', page_url, page_number, conditional=False)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, url, page_number = pending.pop(future)
+                try:
+                    response, soup = future.result()
+                except requests.RequestException as e:
+                    print(f"Failed to fetch {url}: {e}")
+                    continue
+                changed = record_page(url, kind, response)
+
+                if kind == 'listing':
+                    if soup is None or (incremental and not changed):
+                        print(f"Listing page unchanged, stopping at: {url}")
+                        continue
+                    reached_known = False
+                    for publication_url in scraper.extract_publication_links(soup):
+                        if publication_url in seen_publications:
+                            continue
+                        seen_publications.add(publication_url)
+                        if scraper.get_crawl_state(publication_url) is not None:
+                            reached_known = True
+                        # Known publications too, conditionally: a 304 answers from crawl_state, an edit
+                        # (a PDF added or replaced) is picked up
+                        submit('publication', publication_url)
+                    if incremental:
+                        if reached_known:
+                            print(f"Reached already known publications on: {url}")
+                        elif page_number < total_pages:
+                            print(f"Scraping page: {listing_url(page_number + 1)}")
+                            submit('listing', listing_url(page_number + 1), page_number + 1)
+                elif soup is None or not changed:
+                    # Unchanged publication page: its PDFs are already stored
+                    all_pdf_links.extend(scraper.get_publication_pdfs(url))
+                else:
+                    pdf_links = scraper.extract_pdf_links(soup)
+                    all_pdf_links.extend(pdf_links)
+                    for link in pdf_links:
+                        scraper.store_link_in_db(link)
+                        scraper.record_crawl_state(link, 'pdf', publication_url=url)
+
+    session.close()
+    scraper.store.flush()
+    return all_pdf_links
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl CCC publications for PDF links.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="stop paginating at the first page with already-known publications")
+    parser.add_argument('--workers', type=int, default=max_workers)
+    parser.add_argument('--host-limit', type=int, default=per_host_limit)
+    args = parser.parse_args()
+    metrics.export_from_env()
+
+    all_pdf_links = collect_all_pdf_links_concurrent(scraper.base_url, scraper.total_pages,
+                                                     workers=args.workers, host_limit=args.host_limit,
+                                                     incremental=args.incremental)
+    all_pdf_links = list(set(all_pdf_links))
+    print(f"Collected {len(all_pdf_links)} unique PDF links")
+    print(all_pdf_links[:10])  # First 10 links
+
+if __name__ == "__main__":
+    main()
+    scraper.store.close()  # Flush pending links and close the database connection
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from embedder import count_tokens, request_token_budget
+from link_store import connect
+from vector_sync import assign_chunk_ids
+import metrics
+
+num_perm = 128
+bands = 32  # of num_perm // bands rows each: pairs from ~0.4 Jaccard up become candidates
+shingle_words = 5
+# Estimated Jaccard similarity of word shingles at which a document or chunk counts as a duplicate
+document_threshold = float(os.getenv('DEDUP_DOCUMENT_THRESHOLD', '0.9'))
+chunk_threshold = float(os.getenv('DEDUP_CHUNK_THRESHOLD', '0.8'))
+
+_rng = np.random.RandomState(1)  # fixed, so signatures stored by earlier runs stay comparable
+# Multiply-add-shift hashing: the top 32 bits of (a * x + b) mod 2**64, with a odd; uint64 arithmetic wraps
+_a = _rng.randint(0, 1 << 62, num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_b = _rng.randint(0, 1 << 62, num_perm, dtype=np.int64).astype(np.uint64)
+word_pattern = re.compile(r"\w+")
+
+
+def shingles(text):
+    words = word_pattern.findall(text.lower())
+    if len(words) <= shingle_words:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+
+
+def minhash(text):
+    """MinHash signature (num_perm uint32 values) of the text's word 5-shingles."""
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)), dtype=np.uint64)
+    permuted = (np.outer(hashes, _a) + _b) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_buckets(signature):
+    """LSH buckets of a signature, one per band: texts sharing any bucket are candidate duplicates."""
+    rows = num_perm // bands
+    buckets = []
+    for band in range(bands):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8,
+                                 salt=band.to_bytes(2, 'big')).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity: the fraction of agreeing MinHash values."""
+    return float(np.mean(signature == other))
+
+
+class Deduplicator:
+    """Near-duplicate detection of documents and chunks before they are embedded.
+
+    MinHash signatures and their LSH band buckets are kept in links.db. Only
+    canonical entries (the first copy seen) are indexed, so a duplicate is
+    always matched against the document or chunk that was kept. A document
+    that is a near-copy of another URL (a re-upload under a new path) is
+    skipped whole and recorded in duplicate_documents; of the remaining
+    chunks, near-copies of an indexed chunk (front matter, disclaimers,
+    headers) are dropped. Nothing dropped is embedded or stored as a vector.
+    """
+
+    def __init__(self, db_path='links.db', conn=None):
+        # Used from the ingestion consumer thread, then closed from the main thread
+        self.conn = conn or connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS minhash_signatures (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            url TEXT,
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS minhash_bands (
+            kind TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (kind, bucket, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS duplicate_documents (
+            url TEXT PRIMARY KEY,
+            duplicate_of TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            detected_at TEXT
+        );
+        ''')
+        if 'url' not in {row[1] for row in self.conn.execute("PRAGMA table_info(minhash_signatures)")}:
+            self.conn.execute("ALTER TABLE minhash_signatures ADD COLUMN url TEXT")
+        self.conn.commit()
+        self.stats = {'documents': 0, 'duplicate_documents': 0, 'chunks': 0, 'duplicate_chunks': 0,
+                      'skipped_chunks': 0, 'skipped_tokens': 0}
+
+    def find(self, kind, key, signature, threshold, url=None, current=()):
+        """The most similar indexed entry other than key itself, as (key, similarity), if above threshold.
+
+        Entries of url whose keys are not in current belong to an earlier
+        version of the same document and are never matched: they are about
+        to be replaced, not duplicated.
+        """
+        buckets = band_buckets(signature)
+        candidates = [row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT key FROM minhash_bands WHERE kind=? AND bucket IN ({', '.join('?' * len(buckets))})",
+            (kind, *buckets)) if row[0] != key]
+        best = None
+        for start in range(0, len(candidates), 500):
+            batch = candidates[start:start + 500]
+            rows = self.conn.execute(f"SELECT key, signature, url FROM minhash_signatures WHERE kind=? AND key IN "
+                                     f"({', '.join('?' * len(batch))})", (kind, *batch))
+            for other, blob, other_url in rows:
+                if url is not None and other_url == url and other not in current:
+                    continue
+                score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (other, score)
+        return best
+
+    def index(self, kind, key, signature, url=None):
+        self.remove(kind, [key])
+        self.conn.execute("INSERT INTO minhash_signatures (kind, key, signature, url) VALUES (?, ?, ?, ?)",
+                          (kind, key, signature.tobytes(), url))
+        self.conn.executemany("INSERT OR IGNORE INTO minhash_bands (kind, bucket, key) VALUES (?, ?, ?)",
+                              [(kind, bucket, key) for bucket in band_buckets(signature)])
+
+    def remove(self, kind, keys):
+        for key in keys:
+            signature = self.conn.execute("SELECT signature FROM minhash_signatures WHERE kind=? AND key=?",
+                                          (kind, key)).fetchone()
+            if signature is None:
+                continue
+            self.conn.execute("DELETE FROM minhash_signatures WHERE kind=? AND key=?", (kind, key))
+            self.conn.executemany("DELETE FROM minhash_bands WHERE kind=? AND bucket=? AND key=?",
+                                  [(kind, bucket, key)
+                                   for bucket in band_buckets(np.frombuffer(signature[0], dtype=np.uint32))])
+
+    def unique(self, url, chunks):
+        """The chunks of a document that still need embedding: none if the whole document is a duplicate."""
+        if not chunks:
+            return chunks
+        ids = assign_chunk_ids(chunks)
+        signatures = [minhash(chunk.page_content) for chunk in chunks]
+        # The MinHash of a union is the element-wise minimum, so the document costs no extra hashing
+        document = np.minimum.reduce(signatures)
+        with self.lock, self.conn:
+            self.stats['documents'] += 1
+            self.stats['chunks'] += len(chunks)
+            match = self.find('document', url, document, document_threshold)
+            if match is not None:
+                self.remove('document', [url])
+                self.conn.execute("INSERT OR REPLACE INTO duplicate_documents (url, duplicate_of, similarity, "
+                                  "detected_at) VALUES (?, ?, ?, ?)", (url, *match, self.timestamp()))
+                self.stats['duplicate_documents'] += 1
+                self.skipped('document', chunks)
+                return []
+            self.conn.execute("DELETE FROM duplicate_documents WHERE url=?", (url,))
+            self.index('document', url, document, url)
+            kept, duplicates = [], []
+            current = set(ids)  # a changed PDF gets new chunk IDs; its old chunks must not match the new ones
+            for chunk_id, chunk, signature in zip(ids, chunks, signatures):
+                if self.find('chunk', chunk_id, signature, chunk_threshold, url, current) is not None:
+                    duplicates.append(chunk)
+                else:
+                    self.index('chunk', chunk_id, signature, url)  # later chunks, even of this document, match it
+                    kept.append(chunk)
+            self.stats['duplicate_chunks'] += len(duplicates)
+            self.skipped('chunk', duplicates)
+        return kept
+
+    def skipped(self, level, chunks):
+        tokens = sum(count_tokens(chunk.page_content) for chunk in chunks)
+        self.stats['skipped_chunks'] += len(chunks)
+        self.stats['skipped_tokens'] += tokens
+        metrics.inc('dedup_skipped_chunks_total', len(chunks), level=level)
+        metrics.inc('dedup_skipped_tokens_total', tokens, level=level)
+
+    def delete_chunks(self, ids):
+        """Forget chunks whose vectors were deleted, so their next near-copy is kept instead."""
+        with self.lock, self.conn:
+            self.remove('chunk', ids)
+
+    def forget_documents(self, urls):
+        """Forget documents removed from the corpus, and the record of any duplicates of them."""
+        with self.lock, self.conn:
+            self.remove('document', urls)
+            self.conn.executemany("DELETE FROM duplicate_documents WHERE url=? OR duplicate_of=?",
+                                  [(url, url) for url in urls])
+
+    def report(self):
+        stats = self.stats
+        requests = -(-stats['skipped_tokens'] // request_token_budget)
+        return (f"Deduplication: {stats['duplicate_documents']} of {stats['documents']} documents and "
+                f"{stats['duplicate_chunks']} further chunks were near-duplicates - "
+                f"{stats['skipped_chunks']} of {stats['chunks']} vectors and ~{stats['skipped_tokens']} tokens "
+                f"(~{requests} embedding requests) avoided")
+
+    @staticmethod
+    def timestamp():
+        return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,259 @@
+import hashlib
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.embeddings.base import Embeddings
+
+from embedding_cache import model_name
+import metrics
+
+try:
+    import tiktoken  # exact token counts when available (OpenAIEmbeddings depends on it)
+    encoding = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    encoding = None
+
+# Our budget per embeddings request, not an API limit: ada-002 caps each input at 8191 tokens and a
+# request at 2048 inputs. Small requests keep a retry cheap and the per-minute token bucket smooth.
+request_token_budget = 8000
+max_batch_size = 512
+# OpenAI rate limits (per minute); tune for your account tier
+requests_per_minute = 3000
+tokens_per_minute = 1_000_000
+max_in_flight = 4
+max_retries = 6
+backoff_factor = 1.0
+
+
+def count_tokens(text):
+    """Token count of a chunk (a ~4 characters per token estimate without tiktoken)."""
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def batch_by_tokens(token_counts, max_tokens=request_token_budget, max_size=max_batch_size):
+    """Group consecutive items into batches that stay under both the token and size budgets.
+
+    Returns a list of (start, end) index ranges into token_counts.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > max_tokens or i - start >= max_size):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # A single oversized request may take the whole bucket, but never blocks forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_rate_limited(error):
+    """True for HTTP 429 errors from the OpenAI client or the fake embedder."""
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    return status == 429 or type(error).__name__ == 'RateLimitError'
+
+
+class EmbeddingStage:
+    """Embeds chunks in token-budgeted batches with a bounded number of requests in flight.
+
+    Requests are paced by requests-per-minute and tokens-per-minute buckets,
+    429 responses are retried with backoff, and results always come back in
+    input order. Identical texts are embedded once per call, and texts found
+    in the optional EmbeddingCache are never sent at all.
+    """
+
+    def __init__(self, embeddings, in_flight=None, rpm=None, tpm=None,
+                 max_tokens=None, max_size=None, retries=None, sink=None, cache=None):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.cache = cache
+        self.model = model_name(embeddings)
+        self.in_flight = in_flight or max_in_flight
+        self.request_bucket = TokenBucket(rpm or requests_per_minute)
+        self.token_bucket = TokenBucket(tpm or tokens_per_minute)
+        self.max_tokens = max_tokens or request_token_budget
+        self.max_size = max_size or max_batch_size
+        self.retries = max_retries if retries is None else retries
+        self.executor = ThreadPoolExecutor(max_workers=self.in_flight)
+        self.stats = {'chunks': 0, 'unique_chunks': 0, 'tokens': 0, 'requests': 0,
+                      'rate_limited': 0, 'seconds': 0.0}
+        self.stats_lock = threading.Lock()
+        # Documents buffered by consume() until a full batch is worth sending
+        self.buffer = []
+        self.buffered_tokens = 0
+
+    def embed_batch(self, texts, tokens):
+        for attempt in range(self.retries + 1):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            try:
+                with metrics.timer('embed'):
+                    vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.retries:
+                    raise
+                metrics.inc('http_retries_total', reason='429')
+                with self.stats_lock:
+                    self.stats['rate_limited'] += 1
+                time.sleep(backoff_factor * 2 ** attempt)
+                continue
+            with self.stats_lock:
+                self.stats['requests'] += 1
+            metrics.inc('tokens_total', tokens, kind='embed')
+            return vectors
+
+    def embed(self, texts):
+        """Embed texts and return their vectors in the same order."""
+        start = time.perf_counter()
+        # Coalesce duplicates so each distinct text is sent once
+        positions = {}
+        unique = []
+        for text in texts:
+            if text not in positions:
+                positions[text] = len(unique)
+                unique.append(text)
+        counts = [count_tokens(text) for text in unique]
+        if self.cache is not None:
+            vectors = self.cache.get_many(self.model, unique)
+        else:
+            vectors = [None] * len(unique)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        missing_counts = [counts[i] for i in missing]
+        batches = batch_by_tokens(missing_counts, self.max_tokens, self.max_size)
+        futures = [
+            (begin, self.executor.submit(self.embed_batch, [unique[i] for i in missing[begin:end]],
+                                         sum(missing_counts[begin:end])))
+            for begin, end in batches
+        ]
+        for begin, future in futures:
+            batch = future.result()
+            for i, vector in zip(missing[begin:begin + len(batch)], batch):
+                vectors[i] = vector
+        if self.cache is not None:
+            self.cache.put_many(self.model, [unique[i] for i in missing], [vectors[i] for i in missing])
+            self.cache.stats['api_calls_saved'] += (
+                len(batch_by_tokens(counts, self.max_tokens, self.max_size)) - len(batches))
+        with self.stats_lock:
+            self.stats['chunks'] += len(texts)
+            self.stats['unique_chunks'] += len(unique)
+            self.stats['tokens'] += sum(counts)
+            self.stats['seconds'] += time.perf_counter() - start
+        return [vectors[positions[text]] for text in texts]
+
+    def consume(self, url, sha256, chunks):
+        """Ingestion consumer: buffer documents across calls and embed them in full batches.
+
+        The stage's sink(url, sha256, chunks, vectors) is called for each
+        document once its batch has been embedded.
+        """
+        self.buffer.append((url, sha256, chunks))
+        self.buffered_tokens += sum(count_tokens(chunk.page_content) for chunk in chunks)
+        if self.buffered_tokens >= self.max_tokens * self.in_flight:
+            self.flush()
+
+    def flush(self):
+        """Embed every buffered document and hand the vectors to their sinks."""
+        if not self.buffer:
+            return
+        buffer, self.buffer, self.buffered_tokens = self.buffer, [], 0
+        vectors = self.embed([chunk.page_content for _, _, chunks in buffer for chunk in chunks])
+        offset = 0
+        for url, sha256, chunks in buffer:
+            if self.sink is not None:
+                self.sink(url, sha256, chunks, vectors[offset:offset + len(chunks)])
+            offset += len(chunks)
+
+    def report(self):
+        seconds = self.stats['seconds'] or 1e-9
+        return (f"Embedded {self.stats['chunks']} chunks ({self.stats['unique_chunks']} unique) in "
+                f"{self.stats['requests']} requests, {self.stats['rate_limited']} rate-limited retries - "
+                f"{self.stats['chunks'] / seconds:.1f} chunks/sec")
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
+
+
+class StagedEmbeddings(Embeddings):
+    """Langchain Embeddings whose embed_documents goes through an EmbeddingStage."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def embed_documents(self, texts):
+        return self.stage.embed(list(texts))
+
+    def embed_query(self, text):
+        return self.stage.embeddings.embed_query(text)
+
+
+class FakeRateLimitError(Exception):
+    http_status = 429
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embedder: the same text always maps to the same unit vector.
+
+    latency emulates a request round trip and rate_limit_every makes every Nth
+    request fail with a 429, so batching and retries can be exercised offline.
+    """
+
+    def __init__(self, dimension=1536, latency=0.0, rate_limit_every=0):
+        self.model = f"fake-{dimension}"
+        self.dimension = dimension
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'big')
+        rng = random.Random(seed)
+        values = [rng.gauss(0.0, 1.0) for _ in range(self.dimension)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit_every and calls % self.rate_limit_every == 0:
+            raise FakeRateLimitError("Rate limit reached for requests")
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
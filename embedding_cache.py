@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from array import array  # vectors are stored as packed float32
+from collections import OrderedDict
+
+from langchain.embeddings.base import Embeddings
+
+from link_store import connect
+import metrics
+
+cache_path = os.getenv('EMBEDDING_CACHE_DB', 'embeddings.db')
+memory_limit = 64 * 1024 * 1024  # bytes of vectors kept in the in-memory LRU
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def model_name(embeddings):
+    """Cache namespace for an embeddings object (vectors from different models never mix)."""
+    return getattr(embeddings, 'model', None) or type(embeddings).__name__
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model, SHA-256 of the chunk text).
+
+    Vectors live in SQLite as float32 blobs; an in-memory LRU bounded by
+    bytes sits in front of it. Safe to share between threads.
+    """
+
+    def __init__(self, path=None, max_memory_bytes=memory_limit):
+        self.conn = connect(path or cache_path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.max_memory_bytes = max_memory_bytes
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'api_calls_saved': 0}
+
+    def remember(self, key, blob):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        self.memory[key] = blob
+        self.memory_bytes += len(blob)
+        while self.memory_bytes > self.max_memory_bytes and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def get_many(self, model, texts):
+        """Return a list with the cached vector for each text, or None where it is missing."""
+        keys = [(model, text_hash(text)) for text in texts]
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                    self.stats['memory_hits'] += 1
+            missing = list({key[1] for key in keys if key not in found})
+            # Look the rest up on disk in chunks that stay under SQLite's variable limit
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache WHERE model=? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})", [model, *batch])
+                for digest, blob in rows:
+                    found[(model, digest)] = blob
+                    self.remember((model, digest), blob)
+                    self.stats['disk_hits'] += 1
+            misses = sum(1 for key in keys if key not in found)
+            self.stats['misses'] += misses
+        metrics.inc('cache_requests_total', len(keys) - misses, cache='embedding', result='hit')
+        metrics.inc('cache_requests_total', misses, cache='embedding', result='miss')
+        return [unpack(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, texts, vectors):
+        rows = [(model, text_hash(text), pack(vector)) for text, vector in zip(texts, vectors)]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+            for key_model, digest, blob in rows:
+                self.remember((key_model, digest), blob)
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def report(self):
+        return (f"Embedding cache: {self.hit_rate():.1%} hit rate "
+                f"({self.stats['memory_hits']} memory, {self.stats['disk_hits']} disk, "
+                f"{self.stats['misses']} misses), {self.stats['api_calls_saved']} API calls saved")
+
+    def close(self):
+        self.conn.close()
+
+
+def pack(vector):
+    return array('f', vector).tobytes()
+
+
+def unpack(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Langchain Embeddings that consult an EmbeddingCache before calling the wrapped model."""
+
+    def __init__(self, embeddings, cache=None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model = model_name(embeddings)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if not missing:
+            self.cache.stats['api_calls_saved'] += 1
+            return vectors
+        fresh = dict(zip(missing, self.embeddings.embed_documents(missing)))
+        self.cache.put_many(self.model, missing, [fresh[text] for text in missing])
+        return [vector if vector is not None else fresh[text] for text, vector in zip(texts, vectors)]
+
+    def embed_query(self, text):
+        cached = self.cache.get_many(self.model, [text])[0]
+        if cached is not None:
+            self.cache.stats['api_calls_saved'] += 1
+            return cached
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model, [text], [vector])
+        return vector
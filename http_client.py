@@ -0,0 +1,105 @@
+# Pooled HTTP fetching shared by the crawler and the profiler. Unlike crawler (through scraper)
+# it never opens links.db, so importing it has no side effects.
+import threading  # per-host limits are shared between worker threads
+import time
+from email.utils import parsedate_to_datetime  # Retry-After may be an HTTP date
+from urllib.parse import urlsplit
+
+import requests  # for making HTTP requests
+from requests.adapters import HTTPAdapter  # keep-alive connection pool
+
+import metrics
+
+max_retries = 4        # attempts after the first one for 429/5xx/connection errors
+backoff_factor = 0.5   # seconds, doubled on every retry
+request_timeout = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostLimiter:
+    """Bound the number of in-flight requests per host and honour Retry-After pauses."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.not_before = {}
+
+    def _semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.limit)
+            return self.semaphores[host]
+
+    def acquire(self, host):
+        self._semaphore(host).acquire()
+        # Wait out any throttle the server asked for before using the slot
+        while True:
+            with self.lock:
+                delay = self.not_before.get(host, 0) - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+    def pause(self, host, seconds):
+        """Hold back every request to host for the given number of seconds."""
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.not_before[host] = max(self.not_before.get(host, 0), until)
+
+
+def create_session(pool_size):
+    """Create a requests session whose connections are kept alive and reused."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header value in seconds, or None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch(session, limiter, url, headers=None, method='GET'):
+    """Request a URL through the pooled session, retrying with backoff and respecting Retry-After."""
+    host = urlsplit(url).netloc
+    for attempt in range(max_retries + 1):
+        limiter.acquire(host)
+        try:
+            with metrics.timer('fetch', method=method):
+                response = session.request(method, url, headers=headers, timeout=request_timeout)
+                response.content  # read the body while holding the host slot
+        except requests.ConnectionError:
+            if attempt == max_retries:
+                raise
+            metrics.inc('http_retries_total', reason='connection')
+            time.sleep(backoff_factor * 2 ** attempt)
+            continue
+        finally:
+            limiter.release(host)
+        metrics.inc('bytes_total', len(response.content), kind='html')
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = backoff_factor * 2 ** attempt
+            # Throttle the whole host, not just this request
+            limiter.pause(host, delay)
+            metrics.inc('http_retries_total', reason=str(response.status_code))
+            continue
+        response.raise_for_status()
+        return response
@@ -0,0 +1,73 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from answer_cache import document_ids
+import metrics
+
+candidates_per_leg = int(os.getenv('HYBRID_CANDIDATES', '10'))
+vector_budget = float(os.getenv('HYBRID_VECTOR_BUDGET_MS', '2000')) / 1000
+lexical_budget = float(os.getenv('HYBRID_LEXICAL_BUDGET_MS', '300')) / 1000
+rrf_k = 60
+
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='retrieval')
+
+
+def rrf_fuse(result_lists, limit=None, rank_constant=rrf_k):
+    """Reciprocal rank fusion: score each chunk by sum(1 / (rank_constant + rank)) over the lists."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, (doc_id, doc) in enumerate(zip(document_ids(results), results), start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rank_constant + rank)
+            docs.setdefault(doc_id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_id] for doc_id in ranked[:limit]]
+
+
+def vector_search(docsearch, query, k, namespace=None, search_filter=None, query_vector=None):
+    """Vector search by query text, or by its embedding when the caller already has it."""
+    with metrics.timer('retrieve_vector'):
+        if query_vector is None:
+            return docsearch.similarity_search(query, k=k, namespace=namespace, filter=search_filter)
+        results = docsearch.similarity_search_by_vector_with_score(query_vector, k=k, namespace=namespace,
+                                                                   filter=search_filter)
+        return [doc for doc, _ in results]
+
+
+def hybrid_search(docsearch, lexical, query, k=4, namespace=None, search_filter=None, query_vector=None):
+    """Run vector and BM25 retrieval concurrently and fuse their rankings.
+
+    Each leg has its own latency budget; a leg that is late or fails is left
+    out of the fusion rather than holding up the answer. Without a lexical
+    index this is a plain vector search. Pass query_vector if the query is
+    already embedded, so it is not embedded again.
+    """
+    if lexical is None:
+        return vector_search(docsearch, query, k, namespace, search_filter, query_vector)
+
+    def vector_leg():
+        return vector_search(docsearch, query, candidates_per_leg, namespace, search_filter, query_vector)
+
+    def lexical_leg():
+        with metrics.timer('retrieve_lexical'):
+            return [doc for doc, _ in lexical.search(query, candidates_per_leg, search_filter)]
+
+    started = time.perf_counter()
+    legs = {
+        'vector': (executor.submit(vector_leg), vector_budget),
+        'lexical': (executor.submit(lexical_leg), lexical_budget),
+    }
+    results, errors = [], []
+    for name, (future, budget) in legs.items():
+        try:
+            results.append(future.result(timeout=max(0.0, budget - (time.perf_counter() - started))))
+        except TimeoutError:
+            metrics.inc('retrieval_timeouts_total', leg=name)
+            logging.warning(f"{name} retrieval exceeded its {budget * 1000:.0f}ms budget; skipped")
+        except Exception as e:
+            logging.error(f"{name} retrieval failed: {e}")
+            errors.append(e)
+    if not results and errors:
+        raise errors[0]
+    return rrf_fuse(results, limit=k)
@@ -0,0 +1,367 @@
+import argparse
+import os
+import re
+import queue  # bounded hand-off between the process pool and the next stage
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from link_store import connect
+from pdf_cache import PDFCache, iter_pdf_pages
+from embedder import EmbeddingStage, FakeEmbeddings
+from embedding_cache import EmbeddingCache
+from vector_sync import VectorSync, assign_chunk_ids, open_vector_index
+from bm25_index import BM25Index
+from dedup import Deduplicator
+from jobs import JobQueue, rank
+import metrics
+
+db_path = os.getenv('LINKS_DB', 'links.db')
+
+
+def create_text_splitter():
+    """The splitter used for every chunk that goes into the index."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=250,
+        chunk_overlap=50,
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True  # chunk offsets feed the deterministic vector IDs
+    )
+
+
+upload_path = re.compile(r'/wp-content/uploads/(\d{4})/(\d{2})/([^/?#]+?)(?:\.pdf)?(?:[?#].*)?$', re.IGNORECASE)
+
+
+def document_metadata(url):
+    """Year, month and report name encoded in a CCC upload URL (wp-content/uploads/2023/09/<report>.pdf)."""
+    match = upload_path.search(url)
+    if not match:
+        return {}
+    year, month, report = match.groups()
+    return {'year': int(year), 'month': int(month), 'report': report}
+
+
+def record_document_metadata(conn, urls):
+    """Store each URL's year/month/report in the indexed pdf_metadata table."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS pdf_metadata (
+        url TEXT PRIMARY KEY,
+        year INTEGER,
+        month INTEGER,
+        report TEXT
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pdf_metadata_year_month ON pdf_metadata (year, month)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pdf_metadata_report ON pdf_metadata (report)")
+    rows = []
+    for url in urls:
+        metadata = document_metadata(url)
+        rows.append((url, metadata.get('year'), metadata.get('month'), metadata.get('report')))
+    conn.executemany("INSERT OR REPLACE INTO pdf_metadata (url, year, month, report) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def corpus_urls(conn):
+    """All PDF links that are not known to be faulty, in scrape order."""
+    conn.execute("CREATE TABLE IF NOT EXISTS faulty_links (id INTEGER PRIMARY KEY, url TEXT UNIQUE)")
+    rows = conn.execute('''
+    SELECT pdf_links.url FROM pdf_links
+    LEFT JOIN faulty_links ON pdf_links.url = faulty_links.url
+    WHERE faulty_links.url IS NULL
+    ORDER BY pdf_links.id
+    ''')
+    return [row[0] for row in rows]
+
+
+# Per-process state, set up once by init_worker
+worker_cache = None
+worker_splitter = None
+
+
+def init_worker(worker_db_path, cache_directory):
+    global worker_cache, worker_splitter
+    worker_cache = PDFCache(worker_db_path, cache_directory)
+    worker_splitter = create_text_splitter()
+    metrics.registry.drain()  # forked workers start with a copy of the parent's metrics
+
+
+def extract_and_chunk(url):
+    """Worker task: fetch (via the cache), extract pages and chunk one PDF.
+
+    Returns (url, sha256, page_count, chunks, error, metrics snapshot). Text
+    extraction is CPU-bound, which is why this runs in a process pool rather
+    than threads; the worker's metrics travel back with the result.
+    """
+    sha256 = None
+    try:
+        path, sha256 = worker_cache.fetch(url)
+        metadata = document_metadata(url)
+        chunks, page_count = [], 0
+        # Pages are chunked as they are extracted, so only one page is held at a time
+        for page in iter_pdf_pages(path, url, sha256):
+            page.metadata.update(metadata)  # carried onto every chunk as filterable vector metadata
+            with metrics.timer('chunk'):
+                chunks.extend(worker_splitter.split_documents([page]))
+            page_count += 1
+        metrics.inc('chunks_total', len(chunks))
+        return url, sha256, page_count, chunks, None, metrics.registry.drain()
+    except Exception as e:
+        # sha256 is set when the download succeeded and only extraction failed
+        metrics.inc('documents_failed_total')
+        return url, sha256, 0, [], f"{type(e).__name__}: {e}", metrics.registry.drain()
+
+
+def ingest_corpus(urls, consume=None, workers=None, queue_size=64, cache_directory=None, record=None):
+    """Extract and chunk every URL in a process pool and stream the chunks to consume.
+
+    consume(url, sha256, chunks) runs on a single consumer thread, and
+    record(url, sha256, page_count, chunks, error) on the calling thread as
+    each document comes back from the pool, before it is queued. At most
+    2 * workers documents are in flight and at most queue_size finished
+    documents wait for the consumer, so memory stays flat however large the
+    corpus is; a slow consumer simply holds back new submissions.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_queue = queue.Queue(maxsize=queue_size)
+    stats = {'documents': 0, 'failed': 0, 'pages': 0, 'chunks': 0}
+    consumer_errors = []
+
+    def consumer():
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                return
+            if consume is not None and not consumer_errors:
+                try:
+                    consume(*item)
+                except Exception as e:
+                    consumer_errors.append(e)
+
+    consumer_thread = threading.Thread(target=consumer, daemon=True)
+    consumer_thread.start()
+    start = time.perf_counter()
+    remaining = iter(urls)
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(db_path, cache_directory)) as executor:
+        def submit_next():
+            url = next(remaining, None)
+            if url is not None:
+                pending.add(executor.submit(extract_and_chunk, url))
+
+        for _ in range(2 * workers):
+            submit_next()
+        while pending and not consumer_errors:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                url, sha256, page_count, chunks, error, worker_metrics = future.result()
+                metrics.registry.merge(worker_metrics)
+                if record is not None:
+                    record(url, sha256, page_count, chunks, error)
+                if error:
+                    stats['failed'] += 1
+                    print(f"Failed to process {url}: {error}")
+                else:
+                    stats['documents'] += 1
+                    stats['pages'] += page_count
+                    stats['chunks'] += len(chunks)
+                    chunk_queue.put((url, sha256, chunks))  # blocks while the next stage is behind
+                submit_next()
+        for future in pending:
+            future.cancel()
+
+    chunk_queue.put(None)
+    consumer_thread.join()
+    if consumer_errors:
+        raise consumer_errors[0]
+
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+
+def report(stats):
+    elapsed = stats['elapsed'] or 1e-9
+    return (f"Ingested {stats['documents']} documents ({stats['failed']} failed): "
+            f"{stats['pages']} pages, {stats['chunks']} chunks in {elapsed:.1f}s - "
+            f"{stats['pages'] / elapsed:.1f} pages/sec, {stats['chunks'] / elapsed:.1f} chunks/sec")
+
+
+def run_jobs(jobs, consume=None, workers=None, queue_size=64, claim_size=None):
+    """Work through the job table until every claimable document reaches the target stage.
+
+    Jobs are claimed in batches. Documents already chunked by an earlier run
+    go straight to consume from their checkpointed chunks; the rest are
+    downloaded, extracted and chunked in the process pool first. consume
+    is responsible for advancing jobs past the chunked stage. When only
+    failed jobs or jobs leased by other runners are left, the runner sleeps
+    until the next one is due or its lease expires.
+    """
+    workers = workers or os.cpu_count() or 1
+    claim_size = claim_size or 4 * workers
+    totals = {'documents': 0, 'failed': 0, 'pages': 0, 'chunks': 0, 'resumed': 0, 'elapsed': 0.0}
+
+    def record(url, sha256, page_count, chunks, error):
+        if error:
+            jobs.fail(url, error, stage='downloaded' if sha256 else None)
+        else:
+            jobs.save_chunks(url, sha256, page_count, chunks)
+
+    while True:
+        claimed = jobs.claim(claim_size)
+        if not claimed:
+            delay = jobs.next_retry_in()
+            if delay is None:
+                return totals
+            print(f"Waiting {delay:.0f}s for the next retry or lease expiry")
+            time.sleep(delay)
+            continue
+        extract = [url for url, stage in claimed if rank(stage) < rank('chunked')]
+        for url, stage in claimed:
+            if rank(stage) >= rank('chunked'):
+                doc_hash, chunks = jobs.load_chunks(url)
+                totals['resumed'] += 1
+                if consume is not None:
+                    consume(url, doc_hash, chunks)
+        if extract:
+            stats = ingest_corpus(extract, consume=consume, workers=workers, queue_size=queue_size, record=record)
+            for key in ('documents', 'failed', 'pages', 'chunks', 'elapsed'):
+                totals[key] += stats[key]
+
+
+def select_chunks(url, chunks, dedup=None, lexical=None, sync=None):
+    """The chunks of a document that still need embedding: near-duplicates dropped, then BM25-indexed."""
+    if sync is not None:
+        # Runs dedup and the BM25 index itself, in the same order, and keeps only new or changed chunks
+        return sync.changed_chunks(url, chunks)
+    if dedup is not None:
+        chunks = dedup.unique(url, chunks)
+    if lexical is not None:
+        assign_chunk_ids(chunks)
+        lexical.add(chunks)
+    return chunks
+
+
+def process_document(url, sha256, chunks, dedup=None, lexical=None, stage=None, sync=None, jobs=None):
+    """Run one extracted document through the optional stages, always in the order select, embed, upsert.
+
+    Without jobs, embedding is batched across documents by stage.consume(),
+    whose sink (sync.add) queues the upsert. With jobs (which need sync for
+    any embedding) each document is embedded and upserted on its own, so its
+    job is advanced after every stage and a failure is recorded on the job
+    instead of stopping the run.
+    """
+    if jobs is None:
+        chunks = select_chunks(url, chunks, dedup, lexical, sync)
+        if chunks and stage is not None:
+            stage.consume(url, sha256, chunks)
+        return
+    try:
+        chunks = select_chunks(url, chunks, dedup, lexical, sync)
+        if sync is not None:
+            vectors = stage.embed([chunk.page_content for chunk in chunks])
+            jobs.advance(url, 'embedded')
+            sync.add(url, sha256, chunks, vectors)
+            sync.flush()
+            jobs.advance(url, 'upserted')
+    except Exception as e:
+        jobs.fail(url, f"{type(e).__name__}: {e}", stage='chunked')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract and chunk every PDF in links.db.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="extraction processes (default: one per core)")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="finished documents allowed to wait for the next stage")
+    parser.add_argument('--limit', type=int, help="only ingest the first N links")
+    parser.add_argument('--embedder', choices=['none', 'fake', 'openai'], default='none',
+                        help="embed the chunks as they arrive (fake needs no API key)")
+    parser.add_argument('--upsert', action='store_true',
+                        help="upsert new or changed chunks to the vector index and prune removed documents")
+    parser.add_argument('--largest-first', action='store_true',
+                        help="start the largest PDFs first, using the sizes recorded by profiler.py")
+    parser.add_argument('--bm25', action='store_true',
+                        help="add the chunks to the on-disk BM25 index used for hybrid retrieval")
+    parser.add_argument('--dedup', action='store_true',
+                        help="skip near-duplicate documents and chunks (MinHash LSH in links.db) before embedding")
+    parser.add_argument('--jobs', action='store_true',
+                        help="track every document in the ingest_jobs table and resume where the last run stopped")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="with --jobs, retry documents that used up their attempts")
+    args = parser.parse_args()
+    metrics.export_from_env()
+    if args.upsert and args.embedder == 'none':
+        parser.error("--upsert needs an --embedder")
+    if args.jobs and args.embedder != 'none' and not args.upsert:
+        # The vectors would be thrown away, so no job could honestly be recorded as embedded
+        parser.error("--jobs with an --embedder needs --upsert")
+
+    conn = connect(db_path)
+    urls = corpus_urls(conn)
+    record_document_metadata(conn, urls)
+    if args.limit:
+        urls = urls[:args.limit]
+    if args.largest_first:
+        from profiler import largest_first  # pulls in requests and tqdm
+        urls = largest_first(conn, urls)
+    conn.close()
+    print(f"Ingesting {len(urls)} PDFs with {args.workers} workers")
+    stage = None
+    if args.embedder == 'openai':
+        from langchain.embeddings.openai import OpenAIEmbeddings
+        stage = EmbeddingStage(OpenAIEmbeddings(), cache=EmbeddingCache())
+    elif args.embedder == 'fake':
+        stage = EmbeddingStage(FakeEmbeddings(), cache=EmbeddingCache())
+    lexical = BM25Index() if args.bm25 else None
+    dedup = Deduplicator(db_path) if args.dedup else None
+    sync = None
+    if args.upsert:
+        # The BM25 index follows the vector manifest: same chunk IDs, same deletions
+        sync = VectorSync(open_vector_index(), namespace=os.getenv('NAMESPACE', 'default_namespace'),
+                          db_path=db_path, lexical=lexical, dedup=dedup)
+        backfilled = sync.backfill_filters(document_metadata)
+        if backfilled:
+            print(f"Set year/month/report metadata on {backfilled} vectors upserted before it existed")
+        stage.sink = sync.add
+    consume = partial(process_document, dedup=dedup, lexical=lexical, stage=stage, sync=sync)
+
+    if args.jobs:
+        jobs = JobQueue(db_path, target='upserted' if sync else 'chunked')
+        if args.retry_failed:
+            print(f"Reset {jobs.reset_failed()} failed jobs")
+        print(f"Queued {jobs.enqueue(urls)} new jobs")
+        # One document at a time, so every stage it completes is checkpointed
+        consume = partial(consume, jobs=jobs)
+        stats = run_jobs(jobs, consume=consume, workers=args.workers, queue_size=args.queue_size)
+        print(report(stats))
+        print(f"Resumed {stats['resumed']} documents from their checkpointed chunks")
+        print(jobs.summary())
+        jobs.close()
+    else:
+        stats = ingest_corpus(urls, consume=consume, workers=args.workers, queue_size=args.queue_size)
+        print(report(stats))
+    if stage is not None:
+        stage.close()
+        print(stage.report())
+        print(stage.cache.report())
+    if sync is not None:
+        if not args.limit:
+            removed = sync.prune(urls)
+            print(f"Removed vectors of {len(removed)} documents no longer in the corpus")
+        sync.close()
+        print(sync.report())
+    if dedup is not None:
+        print(dedup.report())
+        dedup.close()
+    if lexical is not None:
+        chunk_count, _ = lexical.corpus_stats()
+        print(f"BM25 index: {chunk_count} chunks")
+        lexical.close()
+
+if __name__ == "__main__":
+    main()
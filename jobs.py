@@ -0,0 +1,218 @@
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from langchain.schema import Document
+
+from link_store import connect
+
+# Stages a document passes through, in order; a job's stage is the last one it completed
+STAGES = ('pending', 'downloaded', 'extracted', 'chunked', 'embedded', 'upserted')
+lease_seconds = float(os.getenv('INGEST_JOB_LEASE', '300'))  # renewed by a heartbeat every third of it
+max_attempts = int(os.getenv('INGEST_JOB_ATTEMPTS', '5'))
+retry_base = float(os.getenv('INGEST_JOB_RETRY_SECONDS', '30'))  # doubled after every failure
+retry_max = 6 * 3600
+
+
+def rank(stage):
+    return STAGES.index(stage)
+
+
+def process_alive(worker):
+    """Whether the runner process of a worker ID on this host is still running (assumed so on other hosts)."""
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """Per-document ingestion jobs in the ingest_jobs table of links.db.
+
+    Each job records the last stage its document completed, or 'failed' with
+    the error and the number of attempts at the next stage; failed jobs are
+    retried after an exponential backoff. Runners claim jobs with a lease in
+    an IMMEDIATE transaction, so several processes can work through the same
+    corpus without taking the same document. Leases are short and renewed by a
+    heartbeat thread while the runner lives, so a crashed runner's jobs are
+    picked up again once its lease expires, or at once by a runner on the same
+    host that finds the crashed process gone. Chunks are kept in ingest_chunks
+    until the document reaches the target stage, so a resumed job skips
+    extraction.
+    """
+
+    def __init__(self, db_path='links.db', target='upserted', conn=None):
+        self.target = rank(target)
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        # Written from the ingestion main thread and its consumer thread
+        self.conn = conn or connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            stage INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'pending',
+            doc_hash TEXT,
+            page_count INTEGER,
+            chunk_count INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            lease_until REAL,
+            updated_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_stage ON ingest_jobs (stage, next_attempt_at);
+        CREATE TABLE IF NOT EXISTS ingest_chunks (
+            url TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            PRIMARY KEY (url, seq)
+        ) WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+        self.stopped = threading.Event()
+        self.heartbeat = None
+
+    def enqueue(self, urls):
+        """Add a job for every URL that does not have one yet; returns how many were added."""
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO ingest_jobs (url) VALUES (?)", [(url,) for url in urls])
+            return self.conn.total_changes - before
+
+    def dead_workers(self, now):
+        """Workers holding unexpired leases whose process is known to have exited."""
+        workers = [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT claimed_by FROM ingest_jobs WHERE lease_until >= ? AND claimed_by != ?",
+            (now, self.worker))]
+        return [worker for worker in workers if not process_alive(worker)]
+
+    def unleased(self, now):
+        """SQL condition and parameters for jobs no live runner holds."""
+        dead = self.dead_workers(now)
+        return (f"(lease_until IS NULL OR lease_until < ? OR claimed_by IN ({', '.join('?' * len(dead))}))",
+                (now, *dead))
+
+    def claim(self, limit):
+        """Lease up to limit jobs that are short of the target stage and due; returns [(url, stage)]."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # one claimer at a time across processes
+            try:
+                unleased, params = self.unleased(now)
+                rows = self.conn.execute(f'''
+                SELECT url, stage FROM ingest_jobs
+                WHERE stage < ? AND attempts < ? AND next_attempt_at <= ? AND {unleased}
+                ORDER BY id LIMIT ?
+                ''', (self.target, max_attempts, now, *params, limit)).fetchall()
+                self.conn.executemany("UPDATE ingest_jobs SET claimed_by=?, lease_until=? WHERE url=?",
+                                      [(self.worker, now + lease_seconds, url) for url, _ in rows])
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        if rows and self.heartbeat is None:
+            self.heartbeat = threading.Thread(target=self.renew_leases, daemon=True)
+            self.heartbeat.start()
+        return [(url, STAGES[stage]) for url, stage in rows]
+
+    def renew_leases(self):
+        """Heartbeat: extend the leases of this runner's jobs until close()."""
+        while not self.stopped.wait(lease_seconds / 3):
+            with self.lock, self.conn:
+                self.conn.execute("UPDATE ingest_jobs SET lease_until=? WHERE claimed_by=? AND lease_until IS NOT NULL",
+                                  (time.time() + lease_seconds, self.worker))
+
+    def next_retry_in(self):
+        """Seconds until the next unfinished job is due and unleased, or None if none will be.
+
+        Jobs leased by another live runner count from their lease expiry: if
+        that runner dies, they are claimable then.
+        """
+        now = time.time()
+        with self.lock:
+            dead = self.dead_workers(now)
+            row = self.conn.execute(f'''
+            SELECT MIN(MAX(next_attempt_at, CASE WHEN claimed_by IN ({', '.join('?' * len(dead))}) THEN 0
+                                                 ELSE COALESCE(lease_until, 0) END))
+            FROM ingest_jobs WHERE stage < ? AND attempts < ?
+            ''', (*dead, self.target, max_attempts)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def advance(self, url, stage, **fields):
+        """Record that a document completed stage; its lease is released once it reaches the target."""
+        assignments = ''.join(f", {name}=?" for name in fields)
+        done = rank(stage) >= self.target
+        with self.lock, self.conn:
+            self.conn.execute(f'''
+            UPDATE ingest_jobs SET stage=MAX(stage, ?), state=?, attempts=0, error=NULL, updated_at=?{assignments}
+            {", claimed_by=NULL, lease_until=NULL" if done else ""}
+            WHERE url=?
+            ''', (rank(stage), stage, self.timestamp(), *fields.values(), url))
+            if done:  # the checkpoint is only needed to resume short of the target
+                self.conn.execute("DELETE FROM ingest_chunks WHERE url=?", (url,))
+
+    def fail(self, url, error, stage=None):
+        """Mark a job failed (after completing stage, if given) and schedule its retry with backoff."""
+        with self.lock, self.conn:
+            attempts = self.conn.execute("SELECT attempts FROM ingest_jobs WHERE url=?", (url,)).fetchone()[0] + 1
+            delay = min(retry_max, retry_base * 2 ** (attempts - 1))
+            self.conn.execute('''
+            UPDATE ingest_jobs SET stage=MAX(stage, ?), state='failed', attempts=?, error=?,
+                next_attempt_at=?, claimed_by=NULL, lease_until=NULL, updated_at=?
+            WHERE url=?
+            ''', (rank(stage) if stage else 0, attempts, str(error), time.time() + delay, self.timestamp(), url))
+
+    def save_chunks(self, url, doc_hash, page_count, chunks):
+        """Checkpoint an extracted document's chunks (if later stages need them) and move it to the chunked stage."""
+        self.advance(url, 'extracted', doc_hash=doc_hash, page_count=page_count)
+        if self.target <= rank('chunked'):
+            self.advance(url, 'chunked', chunk_count=len(chunks))
+            return
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ingest_chunks WHERE url=?", (url,))
+            self.conn.executemany("INSERT INTO ingest_chunks (url, seq, text, metadata) VALUES (?, ?, ?, ?)",
+                                  [(url, seq, chunk.page_content, json.dumps(chunk.metadata))
+                                   for seq, chunk in enumerate(chunks)])
+        self.advance(url, 'chunked', chunk_count=len(chunks))
+
+    def load_chunks(self, url):
+        """The checkpointed (doc_hash, chunks) of a document that reached the chunked stage."""
+        with self.lock:
+            doc_hash = self.conn.execute("SELECT doc_hash FROM ingest_jobs WHERE url=?", (url,)).fetchone()[0]
+            rows = self.conn.execute("SELECT text, metadata FROM ingest_chunks WHERE url=? ORDER BY seq", (url,))
+            chunks = [Document(page_content=text, metadata=json.loads(metadata)) for text, metadata in rows]
+        return doc_hash, chunks
+
+    def reset_failed(self):
+        """Give jobs that used up their attempts a fresh set; returns how many were reset."""
+        with self.lock, self.conn:
+            return self.conn.execute("UPDATE ingest_jobs SET attempts=0, next_attempt_at=0 WHERE state='failed'"
+                                     ).rowcount
+
+    def summary(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM ingest_jobs GROUP BY state"))
+        return "Jobs: " + ", ".join(f"{state} {counts[state]}" for state in STAGES + ('failed',) if state in counts)
+
+    @staticmethod
+    def timestamp():
+        return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def close(self):
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+        self.conn.close()
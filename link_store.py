@@ -0,0 +1,75 @@
+import sqlite3  # links.db is shared by the scraper, profiler and processor
+
+
+def connect(db_path='links.db', **kwargs):
+    """Open links.db in WAL mode so readers are not blocked while the scraper writes."""
+    conn = sqlite3.connect(db_path, timeout=30, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL only syncs at checkpoints and is still crash-safe
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class LinkStore:
+    """Buffered writer for a table of unique URLs (pdf_links, faulty_links).
+
+    Known URLs are loaded once so membership checks never hit the database,
+    and new URLs are flushed with a single executemany per transaction
+    instead of one INSERT and commit per link.
+    """
+
+    def __init__(self, db_path='links.db', table='pdf_links', batch_size=500, conn=None):
+        self.conn = conn or connect(db_path)
+        self.table = table
+        self.batch_size = batch_size
+        self.conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE
+        )
+        ''')
+        self.conn.commit()
+        self.known = {row[0] for row in self.conn.execute(f"SELECT url FROM {table}")}
+        self.pending = []
+
+    def __contains__(self, url):
+        return url in self.known
+
+    def __len__(self):
+        return len(self.known)
+
+    def add(self, url):
+        """Queue a URL for insertion; returns False if it is already known."""
+        if url in self.known:
+            return False
+        self.known.add(url)
+        self.pending.append((url,))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def discard(self, url):
+        """Remove a URL, queued or stored (deleted with the next flush's commit); returns False if unknown."""
+        if url not in self.known:
+            return False
+        self.known.discard(url)
+        self.pending = [item for item in self.pending if item[0] != url]
+        self.conn.execute(f"DELETE FROM {self.table} WHERE url=?", (url,))
+        return True
+
+    def flush(self):
+        """Write queued URLs and commit the open transaction."""
+        if self.pending:
+            self.conn.executemany(f"INSERT OR IGNORE INTO {self.table} (url) VALUES (?)", self.pending)
+            self.pending = []
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
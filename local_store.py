@@ -0,0 +1,476 @@
+import argparse
+import json
+import os
+import uuid
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from link_store import connect
+
+# Local backend settings (VECTOR_BACKEND=local selects this store instead of Pinecone)
+index_dir = os.getenv('LOCAL_INDEX_DIR', 'vector_store')
+search_mode = os.getenv('LOCAL_INDEX_SEARCH', 'exact')  # 'exact' or 'ivf'
+ivf_nprobe = int(os.getenv('LOCAL_INDEX_NPROBE', '8'))
+# First pass over the int8 codes (once `quantize` has run), then re-rank k * rerank rows in float32
+quantized_search = os.getenv('LOCAL_INDEX_QUANTIZED', '0') == '1'
+rerank_factor = int(os.getenv('LOCAL_INDEX_RERANK', '10'))
+search_block_rows = 1 << 16  # rows scored per block, bounds temporary memory on large indexes
+code_block_rows = 1 << 8  # int8 rows are widened to float32 in cache-sized blocks
+
+# Metadata kept in indexed columns so filters are pushed down into the search
+filter_columns = {'year': 'INTEGER', 'month': 'INTEGER', 'report': 'TEXT'}
+filter_operators = {'$eq': '=', '$ne': '!=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def filter_sql(search_filter):
+    """Translate a Pinecone-style metadata filter into a SQL condition over the indexed columns."""
+    clauses, params = [], []
+    for key, condition in search_filter.items():
+        if key not in filter_columns:
+            raise ValueError(f"Cannot filter on {key!r}; indexed metadata: {', '.join(filter_columns)}")
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for operator, value in condition.items():
+            if operator in ('$in', '$nin'):
+                negate = 'NOT ' if operator == '$nin' else ''
+                clauses.append(f"{key} {negate}IN ({','.join('?' * len(value))})")
+                params.extend(value)
+            elif operator in filter_operators:
+                clauses.append(f"{key} {filter_operators[operator]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return ' AND '.join(clauses) or '1', params
+
+
+def encode(vectors, quantizer):
+    """int8 codes of normalised vectors under a (low, step) per-dimension quantizer."""
+    low, step = quantizer
+    return np.clip(np.rint((vectors - low) / step) - 128, -128, 127).astype(np.int8)
+
+
+def top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: a memory-mapped float32 matrix plus a SQLite metadata table.
+
+    Vectors are L2-normalised on insert so cosine similarity is a dot
+    product. Search is exact (vectorised over the whole matrix) or, once
+    build_ivf() has run, approximate over the nprobe closest IVF lists.
+    After quantize(), a quantized store scores candidates on a quarter-size
+    memory-mapped int8 copy and re-ranks a k * rerank shortlist with the
+    float32 vectors, so only the codes need to stay in memory.
+    It exposes Pinecone's upsert/delete so VectorSync can write to it, and
+    langchain's similarity_search(query, k, namespace) so the querier can
+    read from it.
+    """
+
+    def __init__(self, embedding=None, directory=None, dimension=None, mode=None, nprobe=None, quantized=None,
+                 rerank=None):
+        self.embedding = embedding
+        self.directory = directory or index_dir
+        self.mode = mode or search_mode
+        self.nprobe = nprobe or ivf_nprobe
+        self.quantized = quantized_search if quantized is None else quantized
+        self.rerank = rerank or rerank_factor
+        os.makedirs(self.directory, exist_ok=True)
+        self.conn = connect(os.path.join(self.directory, 'meta.db'), check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS vectors (
+            row INTEGER PRIMARY KEY,
+            id TEXT UNIQUE NOT NULL,
+            namespace TEXT NOT NULL,
+            text TEXT,
+            metadata TEXT,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(vectors)")}
+        added = [column for column in filter_columns if column not in columns]
+        for column, column_type in filter_columns.items():
+            if column in added:
+                self.conn.execute(f"ALTER TABLE vectors ADD COLUMN {column} {column_type}")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_vectors_{column} ON vectors ({column})")
+        self.conn.commit()
+        if added:
+            self.backfill_filters()
+        stored = self.conn.execute("SELECT value FROM settings WHERE key='dimension'").fetchone()
+        self.dimension = int(stored[0]) if stored else dimension
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self.centroids_path = os.path.join(self.directory, 'ivf_centroids.npy')
+        self.assign_path = os.path.join(self.directory, 'ivf_assign.i32')
+        self.quantizer_path = os.path.join(self.directory, 'sq8_quantizer.npy')
+        self.codes_path = os.path.join(self.directory, 'vectors.i8')
+        self._matrix = None
+        self._codes = None
+        self._quantizer = None
+        self._masks = {}
+        self._ivf = None
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # Storage
+
+    def row_count(self):
+        if not self.dimension or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dimension)
+
+    def matrix(self):
+        """Read-only memory map of every stored vector (deleted rows included)."""
+        rows = self.row_count()
+        if self._matrix is None or len(self._matrix) != rows:
+            if rows == 0:
+                return np.empty((0, self.dimension or 0), dtype=np.float32)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dimension))
+        return self._matrix
+
+    def codes(self):
+        """Read-only memory map of the int8 codes, row for row with matrix()."""
+        rows = self.row_count()
+        if self._codes is None or len(self._codes) != rows:
+            self._codes = np.memmap(self.codes_path, dtype=np.int8, mode='r', shape=(rows, self.dimension))
+        return self._codes
+
+    def quantizer(self):
+        """(low, step) per dimension, or None if the store was never quantized."""
+        if self._quantizer is None and os.path.exists(self.quantizer_path):
+            low, step = np.load(self.quantizer_path)
+            self._quantizer = (low, step)
+        return self._quantizer
+
+    def invalidate(self):
+        self._matrix = None
+        self._codes = None
+        self._quantizer = None
+        self._masks = {}
+        self._ivf = None
+
+    def upsert(self, vectors, namespace=None):
+        """Insert or overwrite (id, values, metadata) tuples, like pinecone.Index.upsert."""
+        # The same id twice in one batch keeps the last copy, as consecutive upserts would
+        vectors = list({item[0]: item for item in vectors}.values())
+        if not vectors:
+            return
+        namespace = namespace or ''
+        if self.dimension is None:
+            self.dimension = len(vectors[0][1])
+            self.conn.execute("INSERT INTO settings (key, value) VALUES ('dimension', ?)", (str(self.dimension),))
+        ids = [item[0] for item in vectors]
+        values = normalize([item[1] for item in vectors])
+        existing = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            existing.update(self.conn.execute(
+                f"SELECT id, row FROM vectors WHERE id IN ({','.join('?' * len(batch))})", batch))
+
+        next_row = self.row_count()
+        rows, appended = [], []
+        for i, vector_id in enumerate(ids):
+            if vector_id in existing:
+                rows.append(existing[vector_id])
+            else:
+                rows.append(next_row)
+                existing[vector_id] = next_row
+                appended.append(i)
+                next_row += 1
+
+        appended_set = set(appended)
+        overwritten = [i for i in range(len(ids)) if i not in appended_set]
+        if overwritten:
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(self.row_count(), self.dimension))
+            matrix[[rows[i] for i in overwritten]] = values[overwritten]
+            matrix.flush()
+            del matrix
+        if appended:
+            with open(self.vectors_path, 'ab') as f:
+                f.write(values[appended].tobytes())
+
+        records = []
+        for (vector_id, _, metadata), row in zip(vectors, rows):
+            metadata = dict(metadata or {})
+            text = metadata.pop('text', None)
+            records.append((row, vector_id, namespace, text, json.dumps(metadata),
+                            *(metadata.get(column) for column in filter_columns)))
+        self.conn.executemany(f'''
+        INSERT OR REPLACE INTO vectors (row, id, namespace, text, metadata, deleted, {', '.join(filter_columns)})
+        VALUES (?, ?, ?, ?, ?, 0, {', '.join('?' * len(filter_columns))})
+        ''', records)
+        self.conn.commit()
+
+        if os.path.exists(self.centroids_path):
+            # Keep the IVF lists current without a rebuild
+            centroids = np.load(self.centroids_path)
+            lists = np.argmax(values @ centroids.T, axis=1).astype(np.int32)
+            if overwritten:
+                assign = np.memmap(self.assign_path, dtype=np.int32, mode='r+')
+                assign[[rows[i] for i in overwritten]] = lists[overwritten]
+                assign.flush()
+                del assign
+            if appended:
+                with open(self.assign_path, 'ab') as f:
+                    f.write(lists[appended].tobytes())
+        quantizer = self.quantizer()
+        if quantizer is not None:
+            # Same for the int8 codes; values outside the trained ranges are clipped
+            codes = encode(values, quantizer)
+            if overwritten:
+                stored_rows = os.path.getsize(self.codes_path) // self.dimension
+                stored = np.memmap(self.codes_path, dtype=np.int8, mode='r+', shape=(stored_rows, self.dimension))
+                stored[[rows[i] for i in overwritten]] = codes[overwritten]
+                stored.flush()
+                del stored
+            if appended:
+                with open(self.codes_path, 'ab') as f:
+                    f.write(codes[appended].tobytes())
+        self.invalidate()
+
+    def backfill_filters(self):
+        """Fill the filter columns of vectors stored before they existed, from each vector's source URL."""
+        from ingest import document_metadata
+
+        updates = []
+        for row, metadata in self.conn.execute("SELECT row, metadata FROM vectors"):
+            metadata = json.loads(metadata or '{}')
+            filters = document_metadata(metadata.get('source', ''))
+            if filters:
+                metadata.update(filters)
+                updates.append((json.dumps(metadata), *(filters[column] for column in filter_columns), row))
+        self.conn.executemany(f'''
+        UPDATE vectors SET metadata=?, {', '.join(f'{column}=?' for column in filter_columns)} WHERE row=?
+        ''', updates)
+        self.conn.commit()
+        self._masks = {}
+        return len(updates)
+
+    def update(self, id, set_metadata=None, namespace=None):
+        """Merge set_metadata into a vector's metadata, like pinecone.Index.update."""
+        found = self.conn.execute("SELECT metadata FROM vectors WHERE id=?", (id,)).fetchone()
+        if found is None or not set_metadata:
+            return
+        metadata = dict(json.loads(found[0] or '{}'), **set_metadata)
+        self.conn.execute(f'''
+        UPDATE vectors SET metadata=?, {', '.join(f'{column}=?' for column in filter_columns)} WHERE id=?
+        ''', (json.dumps(metadata), *(metadata.get(column) for column in filter_columns), id))
+        self.conn.commit()
+        self._masks = {}
+
+    def delete(self, ids, namespace=None):
+        """Tombstone vectors by id, like pinecone.Index.delete."""
+        self.conn.executemany("UPDATE vectors SET deleted=1 WHERE id=?", [(i,) for i in ids])
+        self.conn.commit()
+        self._masks = {}
+
+    def live_mask(self, namespace, search_filter=None, rows=None):
+        """Boolean array over the first rows rows (default: all): True where a vector is live and matches.
+
+        Another process (ingest.py --upsert) may append, overwrite or delete
+        vectors at any time, so cached masks are keyed on the row count and
+        on SQLite's data_version, which changes with every outside commit.
+        """
+        namespace = namespace or ''
+        rows = self.row_count() if rows is None else rows
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        key = (namespace, json.dumps(search_filter, sort_keys=True), rows, data_version)
+        if key not in self._masks:
+            condition, params = filter_sql(search_filter or {})
+            mask = np.zeros(rows, dtype=bool)
+            live = [row for (row,) in self.conn.execute(
+                f"SELECT row FROM vectors WHERE namespace=? AND deleted=0 AND row < ? AND {condition}",
+                [namespace, rows, *params])]
+            mask[np.asarray(live, dtype=np.int64)] = True
+            if len(self._masks) >= 64:
+                self._masks = {}
+            self._masks[key] = mask
+        return self._masks[key]
+
+    # IVF approximate index
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """Cluster the stored vectors with spherical k-means and save the inverted lists."""
+        matrix = self.matrix()
+        rows = len(matrix)
+        nlist = nlist or max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(rows, size=min(rows, 256 * nlist), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize(sums)
+        assign = np.concatenate([
+            np.argmax(matrix[start:start + search_block_rows] @ centroids.T, axis=1)
+            for start in range(0, rows, search_block_rows)
+        ]).astype(np.int32)
+        np.save(self.centroids_path, centroids)
+        assign.tofile(self.assign_path)
+        self._ivf = None
+
+    def ivf(self):
+        """(centroids, row order sorted by list, list offsets), or None if no IVF index was built."""
+        if self._ivf is None and os.path.exists(self.centroids_path):
+            centroids = np.load(self.centroids_path)
+            assign = np.fromfile(self.assign_path, dtype=np.int32)
+            order = np.argsort(assign, kind='stable')
+            offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+            self._ivf = (centroids, order, offsets)
+        return self._ivf
+
+    # int8 scalar quantization
+
+    def quantize(self, sample_size=100_000, seed=0):
+        """Learn each dimension's range from a sample and write the int8 codes of every vector."""
+        matrix = self.matrix()
+        rows = len(matrix)
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(rows, size=min(rows, sample_size), replace=False))]
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        step = np.maximum((high - low) / 255, 1e-9).astype(np.float32)
+        quantizer = (low.astype(np.float32), step)
+        with open(self.codes_path, 'wb') as f:
+            for start in range(0, rows, search_block_rows):
+                f.write(encode(matrix[start:start + search_block_rows], quantizer).tobytes())
+        np.save(self.quantizer_path, np.stack(quantizer))
+        self.invalidate()
+
+    # Search
+
+    def score(self, query, candidates=None):
+        """Scores of the query against candidate rows (every row if None).
+
+        Exact from the float32 matrix, or approximate from the int8 codes when
+        quantized: with x ~ low + (code + 128) * step, x . q is code . (q * step)
+        plus a constant, so the codes are scored without decoding them.
+        """
+        quantizer = self.quantizer() if self.quantized else None
+        if quantizer is None:
+            source, weights, offset, block = self.matrix(), query, 0.0, search_block_rows
+        else:
+            low, step = quantizer
+            source, weights, block = self.codes(), query * step, code_block_rows
+            offset = float(query @ low + 128 * (query @ step))
+        if candidates is not None:
+            return np.asarray(source[candidates], dtype=np.float32) @ weights + offset
+        return np.concatenate([
+            np.asarray(source[start:start + block], dtype=np.float32) @ weights
+            for start in range(0, len(source), block)
+        ]) + offset
+
+    def search_vector(self, query, k=4, namespace=None, search_filter=None):
+        """Top-k (row, cosine score) pairs for a query vector.
+
+        A metadata filter is applied before scoring: a selective filter only
+        scores the matching rows instead of scanning the whole matrix.
+        """
+        if self.row_count() == 0:
+            return []
+        query = normalize(query)
+        matrix = self.matrix()
+        mask = self.live_mask(namespace, search_filter, len(matrix))
+        ivf = self.ivf() if self.mode == 'ivf' else None
+        matching = np.flatnonzero(mask) if search_filter else None
+        if matching is not None and len(matching) <= len(matrix) // 4:
+            candidates = matching
+        elif ivf is not None:
+            centroids, order, offsets = ivf
+            probes = top_k(centroids @ query, self.nprobe)
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+            candidates = np.sort(candidates[mask[candidates]])
+        else:
+            candidates = None
+        scores = self.score(query, candidates)
+        if candidates is None:
+            scores = scores[:len(mask)]  # rows appended since matrix() was mapped wait for the next search
+            scores[~mask] = -np.inf
+        quantized = self.quantized and self.quantizer() is not None
+        best = top_k(scores, k * self.rerank if quantized else k)
+        best = best[np.isfinite(scores[best])]
+        rows = best if candidates is None else candidates[best]
+        if not quantized:
+            return list(zip(rows.tolist(), scores[best].tolist()))
+        # Re-rank the shortlist with full precision; sorted rows read the memory map in order
+        rows = np.sort(rows)
+        exact = matrix[rows] @ query
+        best = top_k(exact, k)
+        return list(zip(rows[best].tolist(), exact[best].tolist()))
+
+    def documents(self, results):
+        rows = [row for row, _ in results]
+        found = {}
+        for row, vector_id, text, metadata in self.conn.execute(
+                f"SELECT row, id, text, metadata FROM vectors WHERE row IN ({','.join('?' * len(rows))})", rows):
+            found[row] = Document(page_content=text or '', metadata=dict(json.loads(metadata), id=vector_id))
+        return [(found[row], score) for row, score in results if row in found]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, namespace=None, filter=None, **kwargs):
+        return self.documents(self.search_vector(embedding, k, namespace, filter))
+
+    def similarity_search_by_vector(self, embedding, k=4, namespace=None, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, namespace, filter)]
+
+    def similarity_search_with_score(self, query, k=4, namespace=None, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, namespace, filter)
+
+    def similarity_search(self, query, k=4, namespace=None, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, namespace, filter)]
+
+    def add_texts(self, texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self.embedding.embed_documents(texts)
+        self.upsert([(i, v, dict(m, text=t)) for i, v, m, t in zip(ids, vectors, metadatas, texts)], namespace)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, namespace=None, **kwargs):
+        store = cls(embedding=embedding, directory=directory)
+        store.add_texts(texts, metadatas, ids, namespace)
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local vector index.")
+    parser.add_argument('command', choices=['build-ivf', 'quantize', 'stats'])
+    parser.add_argument('--nlist', type=int, help="IVF lists (default: sqrt of the row count)")
+    args = parser.parse_args()
+
+    store = LocalVectorStore()
+    if args.command == 'build-ivf':
+        store.build_ivf(nlist=args.nlist)
+        print(f"Built IVF index over {store.row_count()} vectors; search with LOCAL_INDEX_SEARCH=ivf")
+    elif args.command == 'quantize':
+        store.quantize()
+        print(f"Wrote int8 codes of {store.row_count()} vectors "
+              f"({os.path.getsize(store.codes_path) / 2 ** 20:.0f} MB instead of "
+              f"{os.path.getsize(store.vectors_path) / 2 ** 20:.0f} MB); search with LOCAL_INDEX_QUANTIZED=1")
+    else:
+        live = store.conn.execute("SELECT COUNT(*) FROM vectors WHERE deleted=0").fetchone()[0]
+        print(f"{store.row_count()} rows ({live} live), dimension {store.dimension}, in {store.directory}")
+        if store.quantizer() is not None:
+            print(f"int8 codes: {os.path.getsize(store.codes_path) / 2 ** 20:.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+namespace = 'ccc'
+
+
+class Histogram:
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts, count, total):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.count += count
+        self.sum += total
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= target and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Registry:
+    """Process-wide counters and latency histograms, keyed by name and labels.
+
+    Recording is a dict lookup and an addition under one lock, cheap enough
+    for per-page and per-request hot paths. Process-pool workers record into
+    their own registry and hand drain() snapshots back to be merge()d.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time a block into the stage_seconds histogram; failures also count stage_errors_total."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('stage_errors_total', stage=stage, **labels)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def drain(self):
+        """Return and reset everything recorded so far, in a picklable form."""
+        with self.lock:
+            snapshot = (self.counters,
+                        {key: (h.counts, h.count, h.sum) for key, h in self.histograms.items()})
+            self.counters, self.histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        counters, histograms = snapshot
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (counts, count, total) in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.merge(counts, count, total)
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        def label_text(labels, extra=()):
+            pairs = [f'{key}="{value}"' for key, value in labels + tuple(extra)]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {namespace}_{name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{namespace}_{name}{label_text(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {namespace}_{name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{namespace}_{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{namespace}_{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{namespace}_{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """JSON-friendly summary: counter values and per-histogram count, mean and percentiles."""
+        def key_text(name, labels):
+            return name + ''.join(f"[{value}]" for _, value in labels)
+
+        with self.lock:
+            return {
+                'counters': {key_text(*key): value for key, value in sorted(self.counters.items())},
+                'timings': {
+                    key_text(*key): {'count': h.count, 'sum': round(h.sum, 6),
+                                     'mean': round(h.sum / h.count, 6) if h.count else 0.0,
+                                     'p50': round(h.quantile(0.5), 6), 'p90': round(h.quantile(0.9), 6),
+                                     'p99': round(h.quantile(0.99), 6)}
+                    for key, h in sorted(self.histograms.items())
+                },
+            }
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = registry.prometheus().encode(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(registry.summary()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    """Serve /metrics (Prometheus) and /metrics.json from a background thread."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_json(path):
+    with open(path, 'w') as f:
+        json.dump(registry.summary(), f, indent=2)
+
+
+def export_from_env():
+    """Start the endpoint if METRICS_PORT is set and write METRICS_JSON when the process exits."""
+    port = os.getenv('METRICS_PORT')
+    if port:
+        serve(int(port))
+    path = os.getenv('METRICS_JSON')
+    if path:
+        atexit.register(write_json, path)
@@ -0,0 +1,148 @@
+import hashlib  # cache files are named by the SHA-256 of their content
+import mmap
+import os
+import tempfile
+from datetime import datetime, timezone
+
+import requests  # for streaming PDF downloads
+from pypdf import PdfReader  # the parser PyPDFLoader uses, fed from a memory map
+from langchain.schema import Document
+
+from link_store import connect
+import metrics
+
+# Where downloaded PDFs are kept between runs
+cache_dir = os.getenv('PDF_CACHE_DIR', 'pdf_cache')
+download_chunk_size = 1 << 16
+download_timeout = 60
+
+
+class PDFCache:
+    """Content-addressed on-disk cache of downloaded PDFs.
+
+    Each PDF is streamed once to <cache_dir>/<sha[:2]>/<sha>.pdf and its hash
+    and size are recorded in the pdf_files table of links.db, so later runs
+    (and every loader) read the local file instead of downloading it again.
+    """
+
+    def __init__(self, db_path='links.db', directory=None, session=None, conn=None):
+        self.directory = directory or cache_dir
+        os.makedirs(self.directory, exist_ok=True)
+        self.conn = conn or connect(db_path)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_files (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at TEXT
+        )
+        ''')
+        self.conn.commit()
+        self.session = session or requests.Session()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+
+    def path_for(self, sha256):
+        return os.path.join(self.directory, sha256[:2], f"{sha256}.pdf")
+
+    def lookup(self, url):
+        """Return the cached (path, sha256) for a URL, or None if it is not cached."""
+        row = self.conn.execute("SELECT sha256, size FROM pdf_files WHERE url=?", (url,)).fetchone()
+        if row is None:
+            return None
+        sha256, size = row
+        path = self.path_for(sha256)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return None
+        return path, sha256
+
+    def fetch(self, url):
+        """Return (path, sha256) of the local copy of a PDF, downloading it only on a cache miss."""
+        cached = self.lookup(url)
+        if cached is not None:
+            self.hits += 1
+            self.bytes_saved += os.path.getsize(cached[0])
+            metrics.inc('cache_requests_total', cache='pdf', result='hit')
+            return cached
+
+        self.misses += 1
+        metrics.inc('cache_requests_total', cache='pdf', result='miss')
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=self.directory)
+        try:
+            with metrics.timer('download'), os.fdopen(fd, 'wb') as tmp, \
+                    self.session.get(url, stream=True, timeout=download_timeout) as response:
+                response.raise_for_status()
+                for block in response.iter_content(chunk_size=download_chunk_size):
+                    digest.update(block)
+                    tmp.write(block)
+                    size += len(block)
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Re-uploads of the same file under a new URL share one cache entry
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.bytes_downloaded += size
+        metrics.inc('bytes_total', size, kind='pdf')
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.conn.execute('''
+        INSERT INTO pdf_files (url, sha256, size, fetched_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET sha256=excluded.sha256, size=excluded.size, fetched_at=excluded.fetched_at
+        ''', (url, sha256, size, fetched_at))
+        self.conn.commit()
+        return path, sha256
+
+    def report(self):
+        """One-line summary of cache effectiveness for this run."""
+        return (f"PDF cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_downloaded / (1024 * 1024):.2f} MB downloaded, "
+                f"{self.bytes_saved / (1024 * 1024):.2f} MB saved")
+
+    def close(self):
+        self.session.close()
+        self.conn.close()
+
+
+def open_mapped(path):
+    """Memory-map a cached PDF read-only; PDF readers can seek in it like a file."""
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_pdf_pages(path, source, doc_hash=None):
+    """Yield a cached PDF's pages one at a time, with memory bounded per document.
+
+    Objects pypdf parsed for a page (content streams, fonts, images) are
+    dropped from its cache once the page's text is out, and the mapped file
+    pages are handed back to the OS, so a 500-page report costs about as much
+    memory as its largest page rather than the sum of all pages.
+    """
+    metadata = {'source': source}
+    if doc_hash:
+        metadata['doc_hash'] = doc_hash
+    mapped = open_mapped(path)
+    try:
+        reader = PdfReader(mapped)
+        for number, page in enumerate(reader.pages):
+            with metrics.timer('extract'):
+                text = page.extract_text()
+            metrics.inc('pages_total')
+            reader.resolved_objects.clear()
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_DONTNEED)
+            yield Document(page_content=text, metadata=dict(metadata, page=number))
+    finally:
+        mapped.close()
+
+
+def load_pdf_pages(path, source, doc_hash=None):
+    """Load a cached PDF page by page, like PyPDFLoader, but reading through mmap."""
+    return list(iter_pdf_pages(path, source, doc_hash))
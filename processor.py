@@ -2,9 +2,13 @@ import os
 from dotenv import load_dotenv
 import pinecone
 from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import Pinecone
-from langchain.document_loaders import PyPDFLoader
+from pdf_cache import PDFCache, load_pdf_pages  # local content-addressed PDF cache
+from ingest import create_text_splitter, document_metadata
+from embedder import EmbeddingStage, StagedEmbeddings  # batched, rate-limited embedding
+from embedding_cache import EmbeddingCache  # skip chunks embedded on a previous run
+from vector_sync import assign_chunk_ids  # deterministic IDs make re-runs overwrite, not duplicate
+from bm25_index import BM25Index  # lexical leg of hybrid retrieval
 import traceback
 from tqdm import tqdm
 
@@ -17,10 +21,12 @@ def initialize_environment():
     pinecone_env = os.getenv('PINECONE_ENVIRONMENT')
     return openai_api_key, pinecone_api_key, pinecone_env
 
-def load_and_split_pdf(pdf_url):
-    """Load a PDF from the given URL and split it into pages with progress bar."""
-    loader = PyPDFLoader(pdf_url)
-    pages = loader.load_and_split()
+def load_and_split_pdf(pdf_url, cache):
+    """Load a PDF from the given URL (via the local cache) and split it into pages with progress bar."""
+    path, sha256 = cache.fetch(pdf_url)
+    pages = load_pdf_pages(path, pdf_url, sha256)
+    for page in pages:
+        page.metadata.update(document_metadata(pdf_url))
     if not pages:
         print("Error: The text file is empty or faulty.")
         exit(1)
@@ -28,11 +34,7 @@ def load_and_split_pdf(pdf_url):
 
 def split_into_segments(pages):
     """Split pages into smaller text segments with progress bar."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=250,
-        chunk_overlap=50,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    text_splitter = create_text_splitter()
     return tqdm(text_splitter.split_documents(pages), desc="Splitting into segments")
 
 def create_embeddings(pinecone_api_key, pinecone_env, split_docs):
@@ -41,11 +43,19 @@ def create_embeddings(pinecone_api_key, pinecone_env, split_docs):
     index_name = "langchain-demo"
     if index_name not in pinecone.list_indexes():
         pinecone.create_index(name=index_name, metric='cosine', dimension=1536)
-    embeddings = OpenAIEmbeddings()
+    stage = EmbeddingStage(OpenAIEmbeddings(), cache=EmbeddingCache())
+    embeddings = StagedEmbeddings(stage)
     try:
+        ids = assign_chunk_ids(split_docs)
         # Wrapping split_docs with tqdm for progress bar
-        docsearch = Pinecone.from_documents(tqdm(split_docs, desc="Generating embeddings"), embeddings, index_name=index_name)
+        docsearch = Pinecone.from_documents(tqdm(split_docs, desc="Generating embeddings"), embeddings,
+                                            index_name=index_name, ids=ids)
         print(f"Data saved into Pinecone index: {index_name}")
+        lexical = BM25Index()
+        lexical.add(split_docs)
+        lexical.close()
+        print(stage.report())
+        print(stage.cache.report())
         return docsearch
     except Exception as e:
         print(f"Error: {e}")
@@ -55,7 +65,9 @@ def main():
     openai_api_key, pinecone_api_key, pinecone_env = initialize_environment()
     # Replace with your PDF URL (yes, it is hardcoded still)
     pdf_url = "https://www.theccc.org.uk/wp-content/uploads/2023/09/230925-PF-MN-ZEV-Mandate-Response.pdf"
-    pages = load_and_split_pdf(pdf_url)
+    cache = PDFCache()
+    pages = load_and_split_pdf(pdf_url, cache)
+    print(cache.report())
     split_docs = split_into_segments(pages)
     docsearch = create_embeddings(pinecone_api_key, pinecone_env, split_docs)
     print(f'Number of pages loaded: {len(pages)}')
@@ -0,0 +1,170 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import requests
+from tqdm import tqdm
+
+from http_client import HostLimiter, create_session, fetch
+from link_store import LinkStore, connect
+import metrics
+
+db_path = os.getenv('LINKS_DB', 'links.db')
+max_workers = 32
+per_host_limit = 16
+write_batch_size = 200
+
+
+def create_profile_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS pdf_profile (
+        url TEXT PRIMARY KEY,
+        status INTEGER,
+        content_length INTEGER,
+        content_type TEXT,
+        elapsed_ms REAL,
+        error TEXT,
+        profiled_at TEXT
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pdf_profile_length ON pdf_profile (content_length)")
+    conn.commit()
+
+
+def profile_url(session, limiter, url):
+    """HEAD a PDF link and return its profile row: (url, status, length, type, elapsed ms, error)."""
+    started = time.perf_counter()
+    try:
+        response = fetch(session, limiter, url, method='HEAD')
+        status, error = response.status_code, None
+    except requests.HTTPError as e:
+        response, status, error = e.response, e.response.status_code, str(e)
+    except requests.RequestException as e:
+        response, status, error = None, None, str(e)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    length, content_type = None, None
+    if response is not None:
+        content_type = response.headers.get('Content-Type')
+        try:
+            length = int(response.headers['Content-Length'])
+        except (KeyError, ValueError):
+            pass
+    return url, status, length, content_type, elapsed_ms, error
+
+
+def profile_corpus(urls, workers=None, host_limit=None, conn=None):
+    """Profile URLs concurrently over one keep-alive session and persist the results in batches.
+
+    Every result goes to pdf_profile; links that fail or answer with an error
+    status are also added to faulty_links, and links that answer normally
+    are removed from it. Returns the profile rows.
+    """
+    workers = workers or max_workers
+    conn = conn or connect(db_path)
+    create_profile_table(conn)
+    faulty = LinkStore(table='faulty_links', batch_size=write_batch_size, conn=conn)
+    limiter = HostLimiter(host_limit or per_host_limit)
+    session = create_session(workers)
+    rows, pending = [], []
+
+    def write(batch):
+        profiled_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        conn.executemany('''
+        INSERT OR REPLACE INTO pdf_profile (url, status, content_length, content_type, elapsed_ms, error, profiled_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [row + (profiled_at,) for row in batch])
+        faulty.flush()  # commits both tables
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(profile_url, session, limiter, url) for url in urls]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Profiling PDFs"):
+            row = future.result()
+            rows.append(row)
+            pending.append(row)
+            if row[5] is not None:
+                faulty.add(row[0])
+            else:
+                faulty.discard(row[0])  # fixed since it was flagged (profiled again with --refresh)
+            if len(pending) >= write_batch_size:
+                write(pending)
+                pending = []
+    write(pending)
+    session.close()
+    return rows
+
+
+def largest_first(conn, urls):
+    """Order URLs by profiled size, largest first, so the longest documents start early.
+
+    Starting the biggest jobs first keeps one large PDF from finishing alone at
+    the end of a run. URLs without a known size keep their order at the end.
+    """
+    create_profile_table(conn)
+    sizes = dict(conn.execute("SELECT url, content_length FROM pdf_profile WHERE content_length IS NOT NULL"))
+    return sorted(urls, key=lambda url: -sizes.get(url, -1))
+
+
+def report(rows, elapsed=None):
+    ok = [row for row in rows if row[5] is None]
+    sizes = [row[2] for row in ok if row[2] is not None]
+    latencies = sorted(row[4] for row in rows)
+    types = {}
+    for row in ok:
+        content_type = (row[3] or 'unknown').split(';')[0]
+        types[content_type] = types.get(content_type, 0) + 1
+    lines = [f"{len(rows)} links: {len(ok)} ok, {len(rows) - len(ok)} faulty"]
+    if elapsed:
+        lines[0] += f" in {elapsed:.1f}s ({len(rows) / elapsed:.1f} links/sec)"
+    if sizes:
+        lines.append(f"Total size of PDFs: {sum(sizes) / (1024 * 1024):.2f} MB, "
+                     f"largest {max(sizes) / (1024 * 1024):.2f} MB")
+    if latencies:
+        lines.append(f"HEAD latency p50 {latencies[len(latencies) // 2]:.0f}ms, "
+                     f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.0f}ms")
+    lines.append("Content types: " + ", ".join(f"{name} {count}" for name, count in sorted(types.items())))
+    return "\n".join(lines)
+
+
+def plot_sizes(rows):
+    import matplotlib.pyplot as plt  # only needed for the histogram
+
+    sizes_mb = [row[2] / (1024 * 1024) for row in rows if row[5] is None and row[2] is not None]
+    plt.hist(sizes_mb, bins=30, edgecolor='black')
+    plt.title('Distribution of PDF File Sizes')
+    plt.xlabel('File Size (MB)')
+    plt.ylabel('Frequency')
+    plt.grid(True)
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the PDF links in links.db with HEAD requests.")
+    parser.add_argument('--workers', type=int, default=max_workers)
+    parser.add_argument('--host-limit', type=int, default=per_host_limit)
+    parser.add_argument('--refresh', action='store_true', help="re-profile links that already have a profile")
+    parser.add_argument('--plot', action='store_true', help="show a histogram of PDF sizes")
+    args = parser.parse_args()
+    metrics.export_from_env()
+
+    conn = connect(db_path)
+    create_profile_table(conn)
+    query = "SELECT url FROM pdf_links ORDER BY id"
+    if not args.refresh:
+        query = ("SELECT url FROM pdf_links WHERE url NOT IN (SELECT url FROM pdf_profile) "
+                 "ORDER BY id")
+    urls = [row[0] for row in conn.execute(query)]
+    print(f"Profiling {len(urls)} links with {args.workers} workers")
+    started = time.perf_counter()
+    rows = profile_corpus(urls, workers=args.workers, host_limit=args.host_limit, conn=conn)
+    print("This run: " + report(rows, time.perf_counter() - started))
+    rows = [tuple(row) for row in conn.execute(
+        "SELECT url, status, content_length, content_type, elapsed_ms, error FROM pdf_profile")]
+    print("Corpus: " + report(rows))
+    if args.plot:
+        plot_sizes(rows)
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
 import os
+import argparse
+import json
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from functools import lru_cache
 from dotenv import load_dotenv
-import pinecone
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.llms import OpenAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-import langchain.vectorstores
+# Light modules only: langchain, pinecone and the OpenAI clients are imported where they are
+# first needed, so `import querier` (and a pool client) starts in milliseconds
+from answer_cache import AnswerCache, document_ids  # reuse answers to repeated questions
+from hybrid import hybrid_search  # BM25 + vector results fused with reciprocal rank fusion
+import metrics  # per-stage latency histograms: embed_query, retrieve, generate
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+index_name = "langchain-demo"
+# Check that the Pinecone index exists at startup (one extra list_indexes round trip)
+verify_index = os.getenv('PINECONE_VERIFY_INDEX', '0') == '1'
+pool_workers = int(os.getenv('QUERIER_POOL_WORKERS', '4'))
+socket_path = os.getenv('QUERIER_SOCKET', 'querier.sock')
+metrics_interval = 5.0  # seconds between a pool worker's metrics reports to the parent
+
 
 def initialize_environment():
     """Load environment variables and return necessary configurations."""
@@ -22,33 +36,84 @@ def initialize_environment():
     namespace = os.getenv('NAMESPACE', default="default_namespace")
     return openai_api_key, pinecone_api_key, pinecone_env, namespace
 
+@lru_cache(maxsize=None)
 def setup_search(pinecone_api_key, pinecone_env, namespace):
-    """Initialize Pinecone and set up document search."""
+    """Initialize Pinecone (or the local index when VECTOR_BACKEND=local) and set up document search.
+
+    The handle is cached, so every session and pool request in a process shares one index client.
+    """
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    from embedding_cache import CachedEmbeddings, EmbeddingCache  # repeated questions skip the API
+
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(), EmbeddingCache())
+    if os.getenv('VECTOR_BACKEND', 'pinecone') == 'local':
+        from local_store import LocalVectorStore  # offline, in-process alternative to Pinecone
+
+        index = LocalVectorStore(embedding=embeddings)
+        logging.info(f"Using local index in: {index.directory} ({index.mode} search)")
+        return index
+    import pinecone
+    from langchain.vectorstores.pinecone import Pinecone
+
     try:
         pinecone.init(api_key=pinecone_api_key, environment=pinecone_env)
-        embeddings = OpenAIEmbeddings()
-        index_name = "langchain-demo"
-        # Try to connect to an existing index
-        index = langchain.vectorstores.Pinecone.from_existing_index(index_name, embeddings, namespace=namespace)
-        logging.info(f"Connected to existing index: {index_name}")
+        if verify_index:
+            index = Pinecone.from_existing_index(index_name, embeddings, namespace=namespace)
+        else:
+            # pinecone.Index makes no request; a missing index fails on the first query instead
+            index = Pinecone(pinecone.Index(index_name), embeddings, "text", namespace=namespace)
+        logging.info(f"Connected to index: {index_name}")
         return index
     except Exception as e:
-        # Log the exception if connecting to the existing index fails
-        logging.error(f"Failed to connect to existing index: {index_name}. Error: {e}")
-        # Attempt to create a new index if it does not exist
-        try:
-            index = langchain.vectorstores.Pinecone(index_name=index_name, embeddings=embeddings, namespace=namespace)
-            logging.info(f"Created new index: {index_name}")
-            return index
-        except Exception as e:
-            # Log the exception if creating the index fails
-            logging.error(f"Failed to create new index: {index_name}. Error: {e}")
-            # Re-raise the exception to handle it upstream or terminate the script
-            raise
-
-def setup_llm(openai_api_key):
-    """Set up the language model and the question-answering chain."""
-    llm = OpenAI(temperature=0, openai_api_key=openai_api_key)
+        # The index is created by ingestion; the querier only ever reads from it
+        logging.error(f"Failed to connect to index: {index_name}. Error: {e}")
+        raise
+
+@lru_cache(maxsize=None)
+def setup_lexical():
+    """Open the BM25 index built by ingestion, or None (vector search only) if there is none."""
+    from bm25_index import BM25Index, index_path as bm25_path
+
+    if not os.path.exists(bm25_path):
+        return None
+    logging.info(f"Hybrid retrieval with BM25 index: {bm25_path}")
+    return BM25Index(bm25_path)
+
+@lru_cache(maxsize=None)
+def llm_client(openai_api_key, streaming=False):
+    """The OpenAI client, created once per process and shared by every chain."""
+    from langchain.llms import OpenAI
+
+    return OpenAI(temperature=0, openai_api_key=openai_api_key, streaming=streaming)
+
+@lru_cache(maxsize=None)
+def deferred_summary_memory():
+    """A ConversationSummaryBufferMemory whose save_context never calls the LLM.
+
+    Turns are only recorded; the caller runs prune() (which summarizes old
+    turns once the history is over budget) where a blocking call is fine.
+    """
+    from langchain.memory import ConversationSummaryBufferMemory
+
+    class DeferredSummaryMemory(ConversationSummaryBufferMemory):
+        def save_context(self, inputs, outputs):
+            super(ConversationSummaryBufferMemory, self).save_context(inputs, outputs)
+
+    return DeferredSummaryMemory
+
+def setup_llm(openai_api_key, llm=None, summary_llm=None, defer_summary=False):
+    """Set up the language model and the question-answering chain.
+
+    Every call gets its own conversation memory; pass llm to use another client than llm_client's,
+    summary_llm to summarize old turns with a different one, and defer_summary to prune() the
+    memory yourself instead of inside every save_context.
+    """
+    from langchain.chains.question_answering import load_qa_chain
+    from langchain.memory import ConversationSummaryBufferMemory
+    from langchain.prompts import PromptTemplate
+    from context import history_token_budget
+
+    llm = llm or llm_client(openai_api_key)
     template = """You are a chatbot having a conversation with a human.
 Given the following extracted parts of a long document and a question, create a final answer.
 {context}
@@ -58,26 +123,222 @@ Chatbot:"""
     prompt = PromptTemplate(
         input_variables=["chat_history", "human_input", "context"], template=template
     )
-    memory = ConversationBufferMemory(memory_key="chat_history", input_key="human_input")
+    # Recent turns stay verbatim; older ones are folded into a running summary
+    memory_class = deferred_summary_memory() if defer_summary else ConversationSummaryBufferMemory
+    memory = memory_class(llm=summary_llm or llm, max_token_limit=history_token_budget,
+                          memory_key="chat_history", input_key="human_input")
     return load_qa_chain(llm, chain_type="stuff", memory=memory, prompt=prompt)
 
-def user_interaction(docsearch, chain, namespace):
-    """Interact with the user to get their queries and display results."""
+def build_filter(year_from=None, year_to=None, report=None):
+    """Metadata filter (Pinecone syntax) pushed down into the vector search, or None for no filter."""
+    search_filter = {}
+    year = {}
+    if year_from is not None:
+        year['$gte'] = year_from
+    if year_to is not None:
+        year['$lte'] = year_to
+    if year:
+        search_filter['year'] = year
+    if report:
+        search_filter['report'] = {'$eq': report}
+    return search_filter or None
+
+def has_history(memory):
+    """Whether the conversation has earlier turns (or a summary of them) that shape the next answer."""
+    return bool(memory.load_memory_variables({}).get(memory.memory_key))
+
+def answer_question(docsearch, chain, namespace, user_query, search_filter=None, answer_cache=None, lexical=None):
+    """Answer one question: retrieve, then reuse a cached answer or run the chain. Returns (answer, docs).
+
+    Cached answers are keyed on the question and the retrieved chunks only, so
+    they are used (and stored) only for the first turn of a conversation.
+    """
+    from context import assemble_context, prompt_tokens  # bounded prompts
+
+    started = time.perf_counter()
+    # Embedded once: the cache key and the vector search both use it
+    with metrics.timer('embed_query'):
+        question_vector = docsearch.embeddings.embed_query(user_query)
+    with metrics.timer('retrieve'):
+        docs = hybrid_search(docsearch, lexical, user_query, namespace=namespace, search_filter=search_filter,
+                             query_vector=question_vector)
+    doc_ids = document_ids(docs)
+    if answer_cache is not None and has_history(chain.memory):
+        answer_cache = None
+    answer = answer_cache.lookup(question_vector, doc_ids) if answer_cache is not None else None
+    if answer is not None:
+        # Keep the conversation history complete even though the LLM was skipped
+        chain.memory.save_context({'human_input': user_query}, {'output_text': answer})
+        logging.info(answer_cache.report())
+    else:
+        context_docs = assemble_context(docs)
+        tokens = prompt_tokens(context_docs, chain.memory, user_query)
+        with metrics.timer('generate'):
+            answer = chain.run(input_documents=context_docs, question=user_query, human_input=user_query)
+        if answer_cache is not None:
+            answer_cache.store(question_vector, doc_ids, answer)
+        metrics.inc('tokens_total', tokens, kind='prompt')
+        logging.info(f"Prompt tokens: ~{tokens}, turn latency: {time.perf_counter() - started:.2f}s")
+    metrics.observe('stage_seconds', time.perf_counter() - started, stage='turn')
+    return answer, docs
+
+def prompt_questions():
+    """Questions typed by the user, until they type 'exit'."""
     while True:
         user_query = input("Enter your question or type 'exit' to quit: ")
         if user_query.lower() == 'exit':
-            break
-        docs = docsearch.similarity_search(user_query, namespace=namespace)
+            return
+        yield user_query
+
+def user_interaction(docsearch, chain, namespace, search_filter=None, answer_cache=None, lexical=None):
+    """Interact with the user to get their queries and display results."""
+    answer_cache = answer_cache or AnswerCache()
+    for user_query in prompt_questions():
+        answer, docs = answer_question(docsearch, chain, namespace, user_query, search_filter, answer_cache, lexical)
         print(f"Retrieved Docs: {docs}")  # This will print the retrieved documents.
-        answer = chain.run(input_documents=docs, question=user_query, human_input=user_query)
         print(f"Answer: {answer}")
+        if hasattr(docsearch.embeddings, 'cache'):
+            logging.info(docsearch.embeddings.cache.report())
 
-def main():
+def load_backends():
+    """The search index, BM25 index, LLM client and namespace from the environment."""
     openai_api_key, pinecone_api_key, pinecone_env, namespace = initialize_environment()
-    docsearch = setup_search(pinecone_api_key, pinecone_env, namespace)
-    chain = setup_llm(openai_api_key)
-    user_interaction(docsearch, chain, namespace)
+    return (setup_search(pinecone_api_key, pinecone_env, namespace), setup_lexical(),
+            llm_client(openai_api_key), namespace)
+
+def preload():
+    """Import everything a worker needs, so forked workers start with it already loaded."""
+    import langchain.chains.question_answering, langchain.embeddings.openai, langchain.llms  # noqa: F401
+    import langchain.memory, langchain.prompts  # noqa: F401
+    import bm25_index, context, embedding_cache, local_store  # noqa: F401
+    if os.getenv('VECTOR_BACKEND', 'pinecone') != 'local':
+        import pinecone, langchain.vectorstores.pinecone  # noqa: F401
+
+class PoolHandler(socketserver.StreamRequestHandler):
+    """One connection is one conversation: a JSON question per line in, a JSON reply per line out."""
+
+    def handle(self):
+        docsearch, lexical, llm, namespace = self.server.backends
+        chain = setup_llm(None, llm=llm)
+        for line in self.rfile:
+            question = None
+            try:
+                question = json.loads(line)['question']
+                answer, docs = answer_question(docsearch, chain, namespace, question, self.server.search_filter,
+                                               self.server.answer_cache, lexical)
+                reply = {'answer': answer, 'sources': [doc.metadata.get('source') for doc in docs]}
+            except Exception as e:
+                logging.exception(f"Failed to answer: {question if question is not None else line[:200]!r}")
+                reply = {'error': str(e)}
+            self.wfile.write((json.dumps(reply) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+def serve_pool(path=socket_path, workers=pool_workers, search_filter=None, setup=load_backends):
+    """Pre-fork pool: answer questions from short-lived clients with already initialized workers.
+
+    The parent imports the heavy modules once and forks workers; each worker
+    builds its clients with setup() before it accepts connections and then
+    serves any number of them, so a client only pays for a socket round trip.
+    Clients, database connections and threads are created after the fork,
+    never shared across it. Workers that die are replaced. Workers send
+    their metrics to the parent every metrics_interval seconds and when they
+    stop, so the parent's /metrics and METRICS_JSON cover the whole pool.
+    """
+    import multiprocessing
+
+    preload()
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.UnixStreamServer(path, PoolHandler)
+    server.socket.setblocking(False)  # idle workers race for accept(); the losers go back to waiting
+    server.search_filter = search_filter
+    children = set()
+    worker_metrics = multiprocessing.SimpleQueue()
+
+    def collect_metrics():
+        for snapshot in iter(worker_metrics.get, None):
+            metrics.registry.merge(snapshot)
+
+    def report_metrics():
+        while True:
+            time.sleep(metrics_interval)
+            worker_metrics.put(metrics.registry.drain())
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # unwind, so the last metrics are sent
+            metrics.registry.drain()  # forked workers start with a copy of the parent's metrics
+            try:
+                server.backends = setup()
+                server.answer_cache = AnswerCache()
+                threading.Thread(target=report_metrics, daemon=True).start()
+                server.serve_forever()
+            finally:
+                worker_metrics.put(metrics.registry.drain())
+                os._exit(0)
+        children.add(pid)
+
+    for _ in range(workers):
+        spawn()
+    collector = threading.Thread(target=collect_metrics, daemon=True)
+    collector.start()
+    logging.info(f"Querier pool of {workers} workers listening on {path}")
+    try:
+        while True:
+            pid, status = os.wait()
+            children.discard(pid)
+            logging.warning(f"Worker {pid} exited with status {status}, starting a new one")
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            os.waitpid(pid, 0)
+        worker_metrics.put(None)  # after every worker's last report
+        collector.join()
+        server.server_close()
+        os.unlink(path)
+
+def ask(questions, path=socket_path):
+    """Send questions to a running pool over one connection (so one conversation); yields its replies."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        stream = sock.makefile('rwb')
+        for question in questions:
+            stream.write((json.dumps({'question': question}) + "\n").encode('utf-8'))
+            stream.flush()
+            yield json.loads(stream.readline())
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat with the CCC publications.")
+    parser.add_argument('--year-from', type=int, help="only search reports uploaded in or after this year")
+    parser.add_argument('--year-to', type=int, help="only search reports uploaded in or before this year")
+    parser.add_argument('--report', help="only search one report (its PDF file name without .pdf)")
+    parser.add_argument('--serve', action='store_true', help="run a pool of warm workers on --socket")
+    parser.add_argument('--workers', type=int, default=pool_workers, help="pool size for --serve")
+    parser.add_argument('--socket', default=socket_path, help="Unix socket of the worker pool")
+    parser.add_argument('--ask', metavar='QUESTION', help="ask a running pool one question and exit")
+    parser.add_argument('--connect', action='store_true', help="chat through a running pool")
+    args = parser.parse_args()
+    if args.ask or args.connect:
+        for reply in ask([args.ask] if args.ask else prompt_questions(), args.socket):
+            print(f"Answer: {reply.get('answer', reply.get('error'))}")
+        return
+    metrics.export_from_env()
+    search_filter = build_filter(args.year_from, args.year_to, args.report)
+    if search_filter:
+        logging.info(f"Filtering retrieval by: {search_filter}")
+    if args.serve:
+        serve_pool(args.socket, args.workers, search_filter)
+        return
+
+    docsearch, lexical, llm, namespace = load_backends()
+    chain = setup_llm(None, llm=llm)
+    user_interaction(docsearch, chain, namespace, search_filter, lexical=lexical)
 
 # If the script is executed directly, call the main function
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
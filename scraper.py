@@ -1,35 +1,100 @@
 import requests  # for making HTTP requests
 from bs4 import BeautifulSoup  # for parsing HTML
-import sqlite3  # integrating a database for storing all scraped PDF links
-
-# Connect to SQLite database
-conn = sqlite3.connect('links.db')
+import os  # for reading the database location from the environment
+import time  # for bounding how long crawl_state rows wait for a commit
+import hashlib  # for detecting changed publication pages
+from datetime import datetime, timezone  # for stamping when a URL was last seen
+from link_store import LinkStore  # batched, WAL-mode writes to the pdf_links table
+import metrics  # per-stage timings and counters
+
+# Connect to SQLite database (LINKS_DB lets benchmarks point the scraper at a scratch copy).
+# The store creates pdf_links if it doesn't exist and loads the known links into memory.
+db_path = os.getenv('LINKS_DB', 'links.db')
+store = LinkStore(db_path)
+conn = store.conn
 cursor = conn.cursor()
 
-# Create a table for storing PDF links if it doesn't exist
+# Crawl state for incremental re-crawls: validators and content hash of every page
+# fetched, plus the publication page each PDF was found on
 cursor.execute('''
-CREATE TABLE IF NOT EXISTS pdf_links (
-    id INTEGER PRIMARY KEY,
-    url TEXT UNIQUE
+CREATE TABLE IF NOT EXISTS crawl_state (
+    url TEXT PRIMARY KEY,
+    kind TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    last_seen TEXT,
+    publication_url TEXT
 )
 ''')
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_state_publication ON crawl_state (publication_url)")
 
 conn.commit()
 
+# crawl_state rows share the store's transaction; commit them after this many rows or seconds,
+# whichever comes first, so links.db never holds a long-running write transaction
+crawl_state_batch = 100
+crawl_state_interval = 5.0
+uncommitted_crawl_state = 0
+last_commit = time.monotonic()
+
 # Database Operations
 def store_link_in_db(link):
-    """Store a link in the database."""
-    try:
-        cursor.execute("INSERT INTO pdf_links (url) VALUES (?)", (link,))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        # This link already exists in the database
-        pass
+    """Queue a link for the database; it is written with the next batch flush."""
+    store.add(link)
 
 def is_link_in_db(link):
-    """Check if a link is already in the database."""
-    cursor.execute("SELECT 1 FROM pdf_links WHERE url=?", (link,))
-    return cursor.fetchone() is not None
+    """Check if a link is already in the database (or queued for it)."""
+    return link in store
+
+def get_crawl_state(url):
+    """Return the crawl_state row for a URL as a dict, or None if it was never crawled."""
+    cursor.execute("SELECT url, kind, etag, last_modified, content_hash, last_seen, publication_url "
+                   "FROM crawl_state WHERE url=?", (url,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    keys = ('url', 'kind', 'etag', 'last_modified', 'content_hash', 'last_seen', 'publication_url')
+    return dict(zip(keys, row))
+
+def conditional_headers(url):
+    """Build If-None-Match / If-Modified-Since headers from the stored crawl state."""
+    state = get_crawl_state(url)
+    headers = {}
+    if state and state['etag']:
+        headers['If-None-Match'] = state['etag']
+    if state and state['last_modified']:
+        headers['If-Modified-Since'] = state['last_modified']
+    return headers
+
+def record_crawl_state(url, kind, etag=None, last_modified=None, content_hash=None, publication_url=None):
+    """Insert or refresh a crawl_state row; validators missing from a 304 keep their old values.
+
+    Rows are committed (with any queued pdf_links) every crawl_state_batch rows
+    or crawl_state_interval seconds.
+    """
+    global uncommitted_crawl_state, last_commit
+    last_seen = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    cursor.execute('''
+    INSERT INTO crawl_state (url, kind, etag, last_modified, content_hash, last_seen, publication_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        kind = excluded.kind,
+        etag = COALESCE(excluded.etag, crawl_state.etag),
+        last_modified = COALESCE(excluded.last_modified, crawl_state.last_modified),
+        content_hash = COALESCE(excluded.content_hash, crawl_state.content_hash),
+        last_seen = excluded.last_seen,
+        publication_url = COALESCE(excluded.publication_url, crawl_state.publication_url)
+    ''', (url, kind, etag, last_modified, content_hash, last_seen, publication_url))
+    uncommitted_crawl_state += 1
+    if uncommitted_crawl_state >= crawl_state_batch or time.monotonic() - last_commit >= crawl_state_interval:
+        store.flush()
+        uncommitted_crawl_state, last_commit = 0, time.monotonic()
+
+def get_publication_pdfs(publication_url):
+    """Return the PDF links previously found on a publication page."""
+    cursor.execute("SELECT url FROM crawl_state WHERE kind='pdf' AND publication_url=?", (publication_url,))
+    return [row[0] for row in cursor.fetchall()]
 
 # Fetching & Parsing
 # Script will navigate through all the pages, find the PDF links, and save them to a list
@@ -52,22 +117,30 @@ def collect_all_pdf_links(base_url, total_pages):
 
         publication_links = get_publication_links(page_url)
         for publication_url in publication_links:
-                # Check if the publication URL has already been scraped
-            if not is_link_in_db(publication_url):
-                pdf_links = get_pdf_links(publication_url)
-                all_pdf_links.extend(pdf_links)
-                # Store the new links in the database
-                for link in pdf_links:
-                    store_link_in_db(link)
-            else:
-                print(f"Skipping already scraped publication: {publication_url}")
+            # Already scraped publications are re-requested conditionally and answered from crawl_state if unchanged
+            pdf_links = get_pdf_links(publication_url)
+            all_pdf_links.extend(pdf_links)
+            # Store the new links in the database
+            for link in pdf_links:
+                store_link_in_db(link)
+    store.flush()
     return all_pdf_links
 
+def fetch_response(url, headers=None):
+    """GET the URL; raises for error statuses (a 304 is returned)."""
+    with metrics.timer('fetch', method='GET'):
+        response = requests.get(url, headers=headers)
+        response.raise_for_status()
+    metrics.inc('bytes_total', len(response.content), kind='html')
+    return response
+
+def parse(response):
+    with metrics.timer('parse'):
+        return BeautifulSoup(response.content, 'html.parser')
+
 def fetch_content(url):
     """Fetches content from the given URL and returns the BeautifulSoup object."""
-    response = requests.get(url)
-    response.raise_for_status()
-    return BeautifulSoup(response.content, 'html.parser')
+    return parse(fetch_response(url))
 
 def extract_publication_links(soup):
     """Parses the soup object to extract publication links."""
@@ -83,11 +156,23 @@ def get_publication_links(page_url):
     return extract_publication_links(soup)
 
 def get_pdf_links(publication_url):
-    """Fetch content and extract PDF links."""
-    soup = fetch_content(publication_url)
-    return extract_pdf_links(soup)
+    """Fetch content and extract PDF links; an already crawled page that is unchanged (304) uses crawl_state."""
+    response = fetch_response(publication_url, conditional_headers(publication_url))
+    if response.status_code == 304:
+        metrics.inc('not_modified_total')
+        print(f"Publication unchanged: {publication_url}")
+        record_crawl_state(publication_url, 'publication')
+        return get_publication_pdfs(publication_url)
+    record_crawl_state(publication_url, 'publication', etag=response.headers.get('ETag'),
+                       last_modified=response.headers.get('Last-Modified'),
+                       content_hash=hashlib.sha256(response.content).hexdigest())
+    pdf_links = extract_pdf_links(parse(response))
+    for link in pdf_links:
+        record_crawl_state(link, 'pdf', publication_url=publication_url)
+    return pdf_links
 
 def main():
+    metrics.export_from_env()
     # Execution of the scraping process
     all_pdf_links = collect_all_pdf_links(base_url, total_pages)
 
@@ -98,4 +183,4 @@ def main():
 
 if __name__ == "__main__":
     main()
-    conn.close()  # Close the database connection
\ No newline at end of file
+    store.close()  # Flush pending links and close the database connection
\ No newline at end of file
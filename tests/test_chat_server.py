@@ -0,0 +1,68 @@
+import asyncio
+
+from langchain.schema import Document
+
+from answer_cache import AnswerCache
+from benchmarks.fake_llm import FakeLLM
+from chat_server import ChatServer, LangchainBackend, StubBackend
+import querier
+
+
+class FailingLLM(FakeLLM):
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("model unavailable")
+
+
+def offline_backend():
+    backend = LangchainBackend.__new__(LangchainBackend)
+    backend.answer_cache = AnswerCache()
+    backend.querier = querier
+    return backend
+
+
+async def answer(backend, llm):
+    chain = querier.setup_llm(None, llm=llm)
+    retrieved = ([1.0, 0.0], [Document(page_content="Heat pumps", metadata={'id': 'a'})])
+    return [token async for token in backend.stream_answer(chain, "What about heat pumps?", retrieved)]
+
+
+def test_stream_answer_from_a_non_streaming_llm():
+    tokens = asyncio.run(answer(offline_backend(), FakeLLM(answer_tokens=3)))
+    assert len(tokens) == 1 and len(tokens[0].split()) == 3
+
+
+def test_stream_answer_raises_when_the_chain_fails_before_the_first_token():
+    async def failing():
+        await asyncio.wait_for(answer(offline_backend(), FailingLLM()), timeout=5)
+
+    try:
+        asyncio.run(failing())
+    except RuntimeError as e:
+        assert str(e) == "model unavailable"
+    else:
+        raise AssertionError("expected the chain's error")
+
+
+async def send(raw):
+    server = await ChatServer(StubBackend()).serve('127.0.0.1', 0)
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+    writer.write(raw)
+    await writer.drain()
+    status = await reader.readline()
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return status
+
+
+def chat_request(body):
+    return b"POST /chat HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+
+
+def test_malformed_requests_get_400():
+    bodies = (b"null", b"[]", b'"hi"', b"{not json", b'{"session_id": 1}', b'{"session_id": 1, "question": 2}',
+              b'{"session_id": 1, "question": " "}', b'{"question": "Why?"}')
+    for raw in (b"GARBAGE\r\n\r\n", b"POST /chat HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+                b"POST /chat HTTP/1.1\r\nContent-Length: -1\r\n\r\n", *map(chat_request, bodies)):
+        assert asyncio.run(send(raw)).startswith(b"HTTP/1.1 400"), raw
+    assert asyncio.run(send(chat_request(b'{"session_id": 1, "question": "Why?"}'))).startswith(b"HTTP/1.1 200")
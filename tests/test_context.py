@@ -0,0 +1,41 @@
+from langchain.schema import Document
+
+from context import assemble_context, count_tokens, merge_chunks
+
+
+def chunk(text, start, source='report.pdf', page=1):
+    return Document(page_content=text, metadata={'source': source, 'page': page, 'start_index': start})
+
+
+def test_overlapping_chunks_are_merged_once_at_the_best_rank():
+    docs = [chunk("lo world, again", 3), chunk("hello world", 0)]
+    merged = merge_chunks(docs)
+    assert [doc.page_content for doc in merged] == ["hello world, again"]
+    assert merged[0].metadata['start_index'] == 0
+
+
+def test_touching_chunks_merge_but_a_gap_does_not():
+    merged = merge_chunks([chunk("abc", 0), chunk("def", 3), chunk("xyz", 10)])
+    assert [doc.page_content for doc in merged] == ["abcdef", "xyz"]
+
+
+def test_chunks_from_another_source_or_page_are_kept_apart():
+    docs = [chunk("hello world", 0), chunk("lo world, again", 3, source='other.pdf'),
+            chunk("lo world, again", 3, page=2)]
+    assert [(doc.metadata['source'], doc.metadata['page'], doc.page_content) for doc in merge_chunks(docs)] == [
+        ('report.pdf', 1, "hello world"), ('other.pdf', 1, "lo world, again"), ('report.pdf', 2, "lo world, again")]
+
+
+def test_duplicates_are_dropped_and_rank_order_kept():
+    docs = [chunk("second page", 0, page=2), chunk("first", 0), chunk("second page", 0, page=2)]
+    assert [doc.page_content for doc in merge_chunks(docs)] == ["second page", "first"]
+
+
+def test_assemble_context_stops_at_the_token_budget():
+    docs = [chunk("alpha " * 20, 0, page=1), chunk("beta " * 20, 0, page=2), chunk("gamma " * 20, 0, page=3)]
+    first, second = (count_tokens(doc.page_content) for doc in docs[:2])
+    exact = assemble_context(docs, max_tokens=first + second)
+    assert [doc.metadata['page'] for doc in exact] == [1, 2]
+    assert [doc.metadata['page'] for doc in assemble_context(docs, max_tokens=first + second - 1)] == [1]
+    # The best-ranked chunk is always sent, even over budget
+    assert [doc.metadata['page'] for doc in assemble_context(docs, max_tokens=1)] == [1]
@@ -0,0 +1,61 @@
+from langchain.schema import Document
+
+from dedup import Deduplicator
+from vector_sync import VectorSync
+
+
+class FakeIndex:
+    """Pinecone-style upsert/delete over a dict."""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def upsert(self, vectors, namespace=None):
+        for vector_id, values, metadata in vectors:
+            self.vectors[vector_id] = (values, metadata)
+
+    def update(self, id, set_metadata=None, namespace=None):
+        self.vectors[id][1].update(set_metadata or {})
+
+    def delete(self, ids, namespace=None):
+        for vector_id in ids:
+            self.vectors.pop(vector_id, None)
+
+
+def report_chunks(doc_hash, edited_page=None):
+    return [Document(page_content=f"Page {page} of the progress report on heat pumps and surface transport "
+                                  f"{'now revised with new figures' if page == edited_page else 'as published'}",
+                     metadata={'doc_hash': doc_hash, 'page': page, 'start_index': 0})
+            for page in range(5)]
+
+
+def ingest(sync, url, doc_hash, chunks):
+    changed = sync.changed_chunks(url, chunks)
+    sync.add(url, doc_hash, changed, [[1.0, 0.0]] * len(changed))
+    sync.flush()
+    return changed
+
+
+def test_modified_pdf_keeps_its_vectors(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    index = FakeIndex()
+    sync = VectorSync(index, db_path=db_path, dedup=Deduplicator(db_path))
+    url = 'https://example.org/wp-content/uploads/2023/06/report.pdf'
+
+    assert len(ingest(sync, url, 'v1', report_chunks('v1'))) == 5
+    assert len(index.vectors) == 5
+
+    # New bytes give every chunk a new ID; the unchanged pages must not count as copies of the old version
+    assert len(ingest(sync, url, 'v2', report_chunks('v2', edited_page=3))) == 5
+    assert len(index.vectors) == 5
+    assert {metadata['doc_hash'] for _, metadata in index.vectors.values()} == {'v2'}
+
+
+def test_reupload_under_new_url_is_skipped(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    index = FakeIndex()
+    sync = VectorSync(index, db_path=db_path, dedup=Deduplicator(db_path))
+
+    ingest(sync, 'https://example.org/wp-content/uploads/2023/06/report.pdf', 'v1', report_chunks('v1'))
+    assert ingest(sync, 'https://example.org/wp-content/uploads/2024/01/report.pdf', 'v1b', report_chunks('v1b')) == []
+    assert len(index.vectors) == 5
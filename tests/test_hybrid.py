@@ -0,0 +1,76 @@
+import math
+import time
+
+import pytest
+from langchain.schema import Document
+
+import hybrid
+from bm25_index import BM25Index, b, k1
+from hybrid import hybrid_search, rrf_fuse
+
+
+def chunk(chunk_id, text, **metadata):
+    return Document(page_content=text, metadata=dict(metadata, chunk_id=chunk_id))
+
+
+@pytest.fixture
+def lexical(tmp_path):
+    index = BM25Index(str(tmp_path / 'bm25.db'))
+    index.add([chunk('a', "The CB6 budget sets the CB6 path", year=2020),
+               chunk('b', "Heat pumps and the CB6 budget", year=2023),
+               chunk('c', "Surface transport emissions fell", year=2023)])
+    yield index
+    index.close()
+
+
+def bm25(tf, df, length, chunks=3, average_length=13 / 3):
+    idf = math.log(1 + (chunks - df + 0.5) / (df + 0.5))
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+
+
+def test_bm25_scores_exact_terms(lexical):
+    # Lengths without stop words: a = 5 (cb6 budget sets cb6 path), b = 4, c = 4
+    results = lexical.search("the CB6 budget", k=3)
+    assert [doc.metadata['chunk_id'] for doc, _ in results] == ['a', 'b']
+    scores = dict((doc.metadata['chunk_id'], score) for doc, score in results)
+    assert scores['a'] == pytest.approx(bm25(2, 2, 5) + bm25(1, 2, 5))
+    assert scores['b'] == pytest.approx(bm25(1, 2, 4) + bm25(1, 2, 4))
+    assert lexical.search("the", k=3) == []  # stop words only
+    assert [doc.metadata['chunk_id'] for doc, _ in lexical.search("CB6", 3, {'year': {'$gte': 2021}})] == ['b']
+
+
+def test_rrf_fuse_orders_by_summed_reciprocal_rank():
+    a, b_, c = chunk('a', "a"), chunk('b', "b"), chunk('c', "c")
+    # b is second in one list and first in the other; a and c tie and keep first-seen order
+    assert [doc.metadata['chunk_id'] for doc in rrf_fuse([[a, b_], [b_, c]])] == ['b', 'a', 'c']
+    assert [doc.metadata['chunk_id'] for doc in rrf_fuse([[a], [c]])] == ['a', 'c']
+    assert [doc.metadata['chunk_id'] for doc in rrf_fuse([[a, b_], [b_, c]], limit=1)] == ['b']
+
+
+class VectorStub:
+    def __init__(self, docs, delay=0.0, error=None):
+        self.docs, self.delay, self.error = docs, delay, error
+
+    def similarity_search(self, query, k=4, namespace=None, filter=None):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.docs[:k]
+
+
+def test_hybrid_search_keeps_docs_only_one_leg_found(lexical):
+    only_vector = chunk('v', "Vector only")
+    results = hybrid_search(VectorStub([only_vector, chunk('b', "Heat pumps and the CB6 budget")]), lexical,
+                            "CB6 budget", k=4)
+    assert [doc.metadata['chunk_id'] for doc in results] == ['b', 'v', 'a']
+
+
+def test_hybrid_search_skips_a_leg_over_budget_or_failing(lexical, monkeypatch):
+    monkeypatch.setattr(hybrid, 'vector_budget', 0.05)
+    slow = VectorStub([chunk('v', "Vector only")], delay=0.5)
+    assert [doc.metadata['chunk_id'] for doc in hybrid_search(slow, lexical, "CB6", k=4)] == ['a', 'b']
+    failing = VectorStub([], error=RuntimeError("index down"))
+    assert [doc.metadata['chunk_id'] for doc in hybrid_search(failing, lexical, "CB6", k=4)] == ['a', 'b']
+    lexical.close()
+    with pytest.raises(Exception):
+        hybrid_search(failing, lexical, "CB6", k=4)  # both legs failed
@@ -0,0 +1,41 @@
+from bm25_index import BM25Index
+from dedup import Deduplicator
+from embedder import EmbeddingStage, FakeEmbeddings
+from ingest import process_document
+from jobs import JobQueue
+from tests.test_dedup import FakeIndex, report_chunks
+from vector_sync import VectorSync
+
+url = 'https://example.org/wp-content/uploads/2023/06/report.pdf'
+copy_url = 'https://example.org/wp-content/uploads/2024/01/report.pdf'
+
+
+def test_dedup_runs_before_the_bm25_index_and_embedding(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    lexical = BM25Index(str(tmp_path / 'bm25.db'))
+    stage = EmbeddingStage(FakeEmbeddings(dimension=8))
+    embedded = []
+    stage.sink = lambda url, sha256, chunks, vectors: embedded.extend(chunks)
+    for document_url, doc_hash in ((url, 'v1'), (copy_url, 'v1b')):
+        process_document(document_url, doc_hash, report_chunks(doc_hash), dedup=Deduplicator(db_path),
+                         lexical=lexical, stage=stage)
+    stage.close()
+    assert len(embedded) == 5
+    assert lexical.corpus_stats()[0] == 5
+
+
+def test_jobs_are_advanced_through_every_stage(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    index = FakeIndex()
+    sync = VectorSync(index, db_path=db_path)
+    jobs = JobQueue(db_path, target='upserted')
+    jobs.enqueue([url, copy_url])
+    jobs.claim(2)
+    process_document(url, 'v1', report_chunks('v1'), stage=EmbeddingStage(FakeEmbeddings(dimension=8)), sync=sync,
+                     jobs=jobs)
+    # A failing stage is recorded on the job instead of stopping the run
+    process_document(copy_url, 'v2', report_chunks('v2'), stage=None, sync=sync, jobs=jobs)
+    states = dict(jobs.conn.execute("SELECT url, state FROM ingest_jobs"))
+    assert states == {url: 'upserted', copy_url: 'failed'}
+    assert len(index.vectors) == 5
+    jobs.close()
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+import time
+
+from langchain.schema import Document
+
+from jobs import JobQueue
+
+
+def test_dead_runners_jobs_are_reclaimed(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    crashed = JobQueue(db_path, target='chunked')
+    crashed.enqueue(['https://example.org/a.pdf', 'https://example.org/b.pdf'])
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    crashed.worker = crashed.worker.rpartition(':')[0] + ':' + exited.stdout.strip()
+    assert len(crashed.claim(10)) == 2
+    crashed.close()
+
+    rerun = JobQueue(db_path, target='chunked')
+    assert rerun.next_retry_in() == 0
+    assert [url for url, _ in rerun.claim(10)] == ['https://example.org/a.pdf', 'https://example.org/b.pdf']
+    rerun.close()
+
+
+def test_next_retry_in_waits_for_a_live_runners_lease(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    running = JobQueue(db_path, target='chunked')
+    running.enqueue(['https://example.org/a.pdf'])
+    running.worker = 'other-host:1'
+    running.claim(10)
+
+    rerun = JobQueue(db_path, target='chunked')
+    assert rerun.claim(10) == []
+    lease_until = running.conn.execute("SELECT lease_until FROM ingest_jobs").fetchone()[0]
+    assert 0 < rerun.next_retry_in() <= lease_until - time.time() + 1
+    rerun.close()
+    running.close()
+
+
+def stored_chunks(queue):
+    return queue.conn.execute("SELECT COUNT(*) FROM ingest_chunks").fetchone()[0]
+
+
+def test_checkpointed_chunks_are_dropped_at_the_target(tmp_path):
+    url, chunks = 'https://example.org/a.pdf', [Document(page_content="text", metadata={'page': 0})]
+    for target in ('chunked', 'embedded', 'upserted'):
+        queue = JobQueue(str(tmp_path / f"{target}.db"), target=target)
+        queue.enqueue([url])
+        queue.claim(1)
+        queue.save_chunks(url, 'hash', 1, chunks)
+        if target != 'chunked':
+            assert stored_chunks(queue) == 1
+            queue.advance(url, target)
+        assert stored_chunks(queue) == 0
+        queue.close()
@@ -0,0 +1,48 @@
+import numpy as np
+
+from embedder import FakeEmbeddings
+from local_store import LocalVectorStore
+
+
+def test_upsert_same_id_twice_in_one_batch(tmp_path):
+    for existing in ([], [('a', [0.0, 1.0, 0.0], {})]):
+        store = LocalVectorStore(directory=str(tmp_path / f"store{len(existing)}"), dimension=3)
+        store.upsert(existing)
+        store.upsert([('b', [1.0, 0.0, 0.0], {'text': 'first'}), ('b', [0.0, 0.0, 1.0], {'text': 'last'})])
+        assert store.row_count() == len(existing) + 1
+        [(doc, score)] = store.documents(store.search_vector(np.array([0.0, 0.0, 1.0]), k=1))
+        assert doc.page_content == 'last' and doc.metadata['id'] == 'b'
+
+
+def test_add_texts_does_not_overwrite_existing_ids(tmp_path):
+    store = LocalVectorStore(embedding=FakeEmbeddings(dimension=8), directory=str(tmp_path))
+    store.upsert([('1', [1.0] * 8, {'text': 'kept'})])
+    ids = store.add_texts(['new one', 'new two'])
+    assert '1' not in ids
+    assert store.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] == 3
+
+
+def test_vectors_stored_before_filter_columns_are_backfilled(tmp_path):
+    store = LocalVectorStore(directory=str(tmp_path))
+    store.upsert([('old', [1.0, 0.0, 0.0], {'source': 'https://example.org/wp-content/uploads/2021/06/Progress.pdf'})])
+    for column in ('year', 'month', 'report'):
+        store.conn.execute(f"DROP INDEX idx_vectors_{column}")
+        store.conn.execute(f"ALTER TABLE vectors DROP COLUMN {column}")
+    store.conn.commit()
+
+    store = LocalVectorStore(directory=str(tmp_path))
+    hits = store.search_vector(np.array([1.0, 0.0, 0.0]), k=1, search_filter={'year': {'$gte': 2021}})
+    [(doc, _)] = store.documents(hits)
+    assert (doc.metadata['year'], doc.metadata['month'], doc.metadata['report']) == (2021, 6, 'Progress')
+
+
+def test_search_sees_vectors_written_by_another_instance(tmp_path):
+    writer = LocalVectorStore(directory=str(tmp_path))
+    writer.upsert([('a', [1.0, 0.0, 0.0], {}), ('b', [0.0, 1.0, 0.0], {})])
+    reader = LocalVectorStore(directory=str(tmp_path))
+    assert [row for row, _ in reader.search_vector(np.array([0.0, 0.0, 1.0]), k=3)] == [0, 1]
+
+    # e.g. ingest.py --upsert running next to a long-lived querier
+    writer.upsert([('c', [0.0, 0.0, 1.0], {})])
+    writer.delete(['a'])
+    assert [row for row, _ in reader.search_vector(np.array([0.0, 0.0, 1.0]), k=3)] == [2, 1]
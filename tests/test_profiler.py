@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from link_store import LinkStore, connect
+import profiler
+
+
+class PDFHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(200 if self.path == '/ok.pdf' else 404)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', '1024')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_importing_the_profiler_does_not_load_the_scraper(tmp_path):
+    # scraper opens links.db and reads every pdf_links URL when it is imported
+    subprocess.run([sys.executable, '-c', "import sys, profiler; assert 'scraper' not in sys.modules"],
+                   check=True, cwd=tmp_path, env={**os.environ, 'PYTHONPATH': os.getcwd()})
+    assert not (tmp_path / 'links.db').exists()
+
+
+def test_refresh_clears_links_that_are_healthy_again(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PDFHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    conn = connect(str(tmp_path / 'links.db'))
+    with LinkStore(table='faulty_links', conn=connect(str(tmp_path / 'links.db'))) as faulty:
+        faulty.add(f"{base}/ok.pdf")  # broken on an earlier run, fixed since
+
+    profiler.profile_corpus([f"{base}/ok.pdf", f"{base}/missing.pdf"], workers=2, conn=conn)
+    assert [row[0] for row in conn.execute("SELECT url FROM faulty_links")] == [f"{base}/missing.pdf"]
+    server.shutdown()
+    conn.close()
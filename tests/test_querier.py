@@ -0,0 +1,54 @@
+from answer_cache import AnswerCache
+from benchmarks.fake_llm import FakeLLM
+from embedder import FakeEmbeddings
+from local_store import LocalVectorStore
+import querier
+
+
+class CountingLLM(FakeLLM):
+    calls: int = 0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._call(prompt, stop, run_manager, **kwargs)
+
+
+def test_deferred_summary_waits_for_prune():
+    summary_llm = CountingLLM()
+    chain = querier.setup_llm(None, llm=FakeLLM(), summary_llm=summary_llm, defer_summary=True)
+    for turn in range(20):
+        chain.memory.save_context({'human_input': f"question {turn} " * 50}, {'output_text': "answer " * 50})
+    assert summary_llm.calls == 0
+    chain.memory.prune()
+    assert summary_llm.calls == 1
+    assert chain.memory.moving_summary_buffer
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(dimension=8)
+        self.queries = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def test_answer_question_embeds_once_and_caches_only_first_turns(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = LocalVectorStore(embedding=embeddings, directory=str(tmp_path))
+    store.add_texts(["Heat pumps are the main route to low carbon heating"], [{'source': 'report.pdf'}])
+    cache = AnswerCache()
+    question = "What about heat pumps?"
+
+    chain = querier.setup_llm(None, llm=FakeLLM())
+    first, _ = querier.answer_question(store, chain, None, question, answer_cache=cache)
+    assert embeddings.queries == 1
+
+    # Same question later in another conversation: the cached answer is reused
+    chain = querier.setup_llm(None, llm=CountingLLM())
+    assert querier.answer_question(store, chain, None, question, answer_cache=cache)[0] == first
+    assert chain.llm_chain.llm.calls == 0
+    # A follow-up depends on the history, which the cache key does not cover
+    querier.answer_question(store, chain, None, question, answer_cache=cache)
+    assert chain.llm_chain.llm.calls == 1
@@ -0,0 +1,60 @@
+from langchain.schema import Document
+
+from tests.test_dedup import FakeIndex, ingest
+from vector_sync import VectorSync
+
+first_url = 'https://example.org/wp-content/uploads/2023/06/report.pdf'
+second_url = 'https://example.org/publications/report.pdf'
+
+
+def report_chunks():
+    return [Document(page_content=f"Page {page} of the progress report", metadata={'doc_hash': 'v1', 'page': page})
+            for page in range(3)]
+
+
+def test_same_pdf_under_two_urls(tmp_path):
+    index = FakeIndex()
+    sync = VectorSync(index, db_path=str(tmp_path / 'links.db'))
+
+    assert len(ingest(sync, first_url, 'v1', report_chunks())) == 3
+    # The second URL shares the first one's vectors, now and on every later run
+    assert ingest(sync, second_url, 'v1', report_chunks()) == []
+    assert ingest(sync, first_url, 'v1', report_chunks()) == []
+    assert ingest(sync, second_url, 'v1', report_chunks()) == []
+    assert sync.stats['upserted'] == 3
+
+    assert sync.prune([second_url]) == [first_url]
+    assert len(index.vectors) == 3
+    assert sync.prune([]) == [second_url]
+    assert index.vectors == {}
+
+
+def test_manifest_keyed_on_id_is_migrated(tmp_path):
+    db_path = str(tmp_path / 'links.db')
+    sync = VectorSync(FakeIndex(), db_path=db_path)
+    sync.conn.executescript('''
+    DROP TABLE vector_manifest;
+    CREATE TABLE vector_manifest (id TEXT PRIMARY KEY, url TEXT NOT NULL, doc_hash TEXT NOT NULL, page INTEGER,
+                                  chunk_offset INTEGER, text_hash TEXT NOT NULL, upserted_at TEXT);
+    INSERT INTO vector_manifest VALUES ('a', 'https://example.org/a.pdf', 'v1', 0, 0, 'h', NULL);
+    ''')
+    sync.close()
+
+    sync = VectorSync(FakeIndex(), db_path=db_path)
+    assert sync.conn.execute("SELECT id, url, filters_set FROM vector_manifest").fetchall() == \
+        [('a', 'https://example.org/a.pdf', 0)]
+    sync.conn.execute("INSERT INTO vector_manifest (id, url, doc_hash, text_hash) "
+                      "VALUES ('a', 'https://example.org/b.pdf', 'v1', 'h')")
+    sync.close()
+
+
+def test_vectors_upserted_before_filter_metadata_are_backfilled(tmp_path):
+    from ingest import document_metadata
+
+    index = FakeIndex()
+    sync = VectorSync(index, db_path=str(tmp_path / 'links.db'))
+    ingest(sync, first_url, 'v1', report_chunks())
+    sync.conn.execute("UPDATE vector_manifest SET filters_set=0")
+    assert sync.backfill_filters(document_metadata) == 3
+    assert {(metadata['year'], metadata['report']) for _, metadata in index.vectors.values()} == {(2023, 'report')}
+    assert sync.backfill_filters(document_metadata) == 0
@@ -0,0 +1,238 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from link_store import connect
+import metrics
+
+index_name = os.getenv('PINECONE_INDEX', 'langchain-demo')
+vector_backend = os.getenv('VECTOR_BACKEND', 'pinecone')  # 'pinecone' or 'local'
+upsert_batch_size = 100  # Pinecone's recommended vectors per upsert request
+
+
+def chunk_id(doc_hash, page, offset):
+    """Deterministic vector ID for a chunk: the same chunk always gets the same ID."""
+    return hashlib.sha256(f"{doc_hash}:{page}:{offset}".encode()).hexdigest()[:32]
+
+
+def assign_chunk_ids(chunks):
+    """Stamp each chunk's metadata with its chunk_id and return the IDs in order.
+
+    Chunks need doc_hash, page and start_index metadata, which the PDF cache
+    loader and create_text_splitter() provide.
+    """
+    ids = []
+    for chunk in chunks:
+        metadata = chunk.metadata
+        chunk_id_ = chunk_id(metadata['doc_hash'], metadata.get('page', 0), metadata.get('start_index', 0))
+        metadata['chunk_id'] = chunk_id_
+        ids.append(chunk_id_)
+    return ids
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def open_pinecone_index(name=None):
+    """Connect to the Pinecone index using the same environment variables as processor.py."""
+    import pinecone
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    pinecone.init(api_key=os.getenv('PINECONE_API_KEY'), environment=os.getenv('PINECONE_ENVIRONMENT'))
+    return pinecone.Index(name or index_name)
+
+
+def open_vector_index():
+    """The write side of the configured vector backend."""
+    if vector_backend == 'local':
+        from local_store import LocalVectorStore
+        return LocalVectorStore()
+    return open_pinecone_index()
+
+
+class VectorSync:
+    """Delta upserts to a vector index, tracked by a manifest table in links.db.
+
+    index is anything with Pinecone's upsert(vectors=..., namespace=...) and
+    delete(ids=..., namespace=...) methods. Only chunks whose ID or text is not
+    in the manifest are embedded and upserted; vectors of chunks that
+    disappeared from a document (or of removed documents) are deleted.
+    Identical PDFs under several URLs share chunk IDs, so the manifest has a
+    row per (id, url) and a vector is only deleted once no URL uses it.
+    Rows with filters_set=0 were upserted before vectors carried the
+    year/month/report filter metadata; backfill_filters() adds it in place.
+    A lexical index (bm25_index.BM25Index) is kept in step with the vectors.
+    With a dedup.Deduplicator, near-duplicate documents and chunks are left
+    out before the comparison, so they are never embedded and any vectors
+    they had are deleted.
+    """
+
+    def __init__(self, index, namespace=None, db_path='links.db', conn=None, batch_size=upsert_batch_size,
+                 lexical=None, dedup=None):
+        self.index = index
+        self.lexical = lexical
+        self.dedup = dedup
+        self.namespace = namespace
+        self.batch_size = batch_size
+        # Used from the ingestion consumer thread, then closed from the main thread
+        self.conn = conn or connect(db_path, check_same_thread=False)
+        primary_key = [row[1] for row in sorted(self.conn.execute("PRAGMA table_info(vector_manifest)"),
+                                                 key=lambda row: row[5]) if row[5]]
+        if primary_key == ['id']:
+            # Manifests from before (id, url) keys: one row per id, whichever URL wrote it last
+            self.conn.execute("ALTER TABLE vector_manifest RENAME TO vector_manifest_by_id")
+            self.conn.execute("DROP INDEX IF EXISTS idx_vector_manifest_url")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS vector_manifest (
+            id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            doc_hash TEXT NOT NULL,
+            page INTEGER,
+            chunk_offset INTEGER,
+            text_hash TEXT NOT NULL,
+            upserted_at TEXT,
+            filters_set INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (id, url)
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_vector_manifest_url ON vector_manifest (url)")
+        if primary_key == ['id']:
+            self.conn.execute("INSERT INTO vector_manifest (id, url, doc_hash, page, chunk_offset, text_hash, "
+                              "upserted_at, filters_set) SELECT id, url, doc_hash, page, chunk_offset, text_hash, "
+                              "upserted_at, 0 FROM vector_manifest_by_id")
+            self.conn.execute("DROP TABLE vector_manifest_by_id")
+        if 'filters_set' not in {row[1] for row in self.conn.execute("PRAGMA table_info(vector_manifest)")}:
+            self.conn.execute("ALTER TABLE vector_manifest ADD COLUMN filters_set INTEGER NOT NULL DEFAULT 0")
+        self.conn.commit()
+        self.pending = []  # (manifest row, vector) waiting for the next upsert batch
+        self.stats = {'upserted': 0, 'unchanged': 0, 'deleted': 0, 'upsert_requests': 0}
+
+    def changed_chunks(self, url, chunks):
+        """Assign IDs and return the chunks that are new or changed; stale vectors are deleted."""
+        if self.dedup is not None:
+            chunks = self.dedup.unique(url, chunks)
+        ids = assign_chunk_ids(chunks)
+        if self.lexical is not None:
+            self.lexical.add(chunks)  # unchanged chunks are skipped by the index itself
+        known = dict(self.conn.execute("SELECT id, text_hash FROM vector_manifest WHERE url=?", (url,)))
+        changed = [chunk for chunk_id_, chunk in zip(ids, chunks)
+                   if known.get(chunk_id_) != text_hash(chunk.page_content)]
+        shared = self.shared_rows(url, changed)
+        if shared:
+            # Already upserted for another URL with the same bytes: only record that this URL uses them too
+            self.conn.executemany('''
+            INSERT OR REPLACE INTO vector_manifest (id, url, doc_hash, page, chunk_offset, text_hash, upserted_at,
+                                                    filters_set)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', shared)
+            self.conn.commit()
+            shared_ids = {row[0] for row in shared}
+            changed = [chunk for chunk in changed if chunk.metadata['chunk_id'] not in shared_ids]
+        self.stats['unchanged'] += len(chunks) - len(changed)
+        stale = set(known) - set(ids)
+        if stale:
+            self.delete_ids(sorted(stale), url)
+        return changed
+
+    def shared_rows(self, url, chunks):
+        """Manifest rows for url copied from other URLs that hold the same chunk IDs with the same text."""
+        hashes = {chunk.metadata['chunk_id']: text_hash(chunk.page_content) for chunk in chunks}
+        rows, ids = [], list(hashes)
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows.extend(self.conn.execute(f'''
+            SELECT id, ?, doc_hash, page, chunk_offset, text_hash, upserted_at, filters_set FROM vector_manifest
+            WHERE url != ? AND id IN ({', '.join('?' * len(batch))})
+            ''', (url, url, *batch)))
+        found = {}
+        for row in rows:
+            if hashes[row[0]] == row[5]:
+                found[row[0]] = row
+        return list(found.values())
+
+    def add(self, url, doc_hash, chunks, vectors):
+        """Queue embedded chunks for upsert; flushed in batches of batch_size."""
+        for chunk, vector in zip(chunks, vectors):
+            metadata = dict(chunk.metadata, text=chunk.page_content)
+            row = (metadata['chunk_id'], url, doc_hash, metadata.get('page', 0),
+                   metadata.get('start_index', 0), text_hash(chunk.page_content))
+            self.pending.append((row, (metadata['chunk_id'], vector, metadata)))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Upsert queued vectors, then record them in the manifest."""
+        while self.pending:
+            batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            with metrics.timer('upsert'):
+                self.index.upsert(vectors=[item for _, item in batch], namespace=self.namespace)
+            metrics.inc('vectors_upserted_total', len(batch))
+            self.stats['upsert_requests'] += 1
+            self.stats['upserted'] += len(batch)
+            upserted_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+            self.conn.executemany('''
+            INSERT OR REPLACE INTO vector_manifest (id, url, doc_hash, page, chunk_offset, text_hash, upserted_at,
+                                                    filters_set)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            ''', [row + (upserted_at,) for row, _ in batch])
+            self.conn.commit()
+
+    def backfill_filters(self, document_metadata):
+        """Set the filter metadata (document_metadata(url)) on vectors upserted without it; returns how many."""
+        rows = self.conn.execute("SELECT DISTINCT id, url FROM vector_manifest WHERE filters_set=0").fetchall()
+        updated = 0
+        for vector_id, url in rows:
+            filters = document_metadata(url)
+            if filters:
+                with metrics.timer('update'):
+                    self.index.update(id=vector_id, set_metadata=filters, namespace=self.namespace)
+                updated += 1
+            self.conn.execute("UPDATE vector_manifest SET filters_set=1 WHERE id=? AND url=?", (vector_id, url))
+            self.conn.commit()
+        return updated
+
+    def delete_ids(self, ids, url=None):
+        """Drop url's manifest rows for ids (every URL's if None); vectors no URL uses any more are deleted."""
+        for start in range(0, len(ids), 1000):
+            batch = ids[start:start + 1000]
+            placeholders = ', '.join('?' * len(batch))
+            if url is None:
+                self.conn.execute(f"DELETE FROM vector_manifest WHERE id IN ({placeholders})", batch)
+            else:
+                self.conn.execute(f"DELETE FROM vector_manifest WHERE url=? AND id IN ({placeholders})",
+                                  (url, *batch))
+            in_use = {row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT id FROM vector_manifest WHERE id IN ({placeholders})", batch)}
+            in_use.update(row[0] for row, _ in self.pending if row[1] != url)
+            self.conn.commit()
+            batch = [i for i in batch if i not in in_use]
+            if not batch:
+                continue
+            self.index.delete(ids=batch, namespace=self.namespace)
+            if self.lexical is not None:
+                self.lexical.delete(batch)
+            if self.dedup is not None:
+                self.dedup.delete_chunks(batch)
+            self.stats['deleted'] += len(batch)
+
+    def prune(self, current_urls):
+        """Delete the vectors of every document that is no longer in the corpus."""
+        current = set(current_urls)
+        removed = [url for (url,) in self.conn.execute("SELECT DISTINCT url FROM vector_manifest")
+                   if url not in current]
+        for url in removed:
+            ids = [row[0] for row in self.conn.execute("SELECT id FROM vector_manifest WHERE url=?", (url,))]
+            self.delete_ids(ids, url)
+        if self.dedup is not None:
+            self.dedup.forget_documents(removed)
+        return removed
+
+    def report(self):
+        return (f"Vector sync: {self.stats['upserted']} upserted in {self.stats['upsert_requests']} requests, "
+                f"{self.stats['unchanged']} unchanged, {self.stats['deleted']} deleted")
+
+    def close(self):
+        self.flush()
+        self.conn.close()